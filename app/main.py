@@ -1,16 +1,32 @@
-from fastapi import FastAPI, HTTPException, Query, Request
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse, ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 import json
 import asyncio
+import os
 import uvicorn
 import time # Added for timestamp calculations
 from typing import List, Dict, Any
 import logging # Import logging
 
-# Import sync redis client. Async client related parts will be commented out.
-# from core.redis.client import redis_client, async_redis_client, get_flash_data, ALL_FLASHES_BY_TIME_KEY, FLASH_DATA_PREFIX
-from core.redis.client import redis_client, get_flash_data, ALL_FLASHES_BY_TIME_KEY, FLASH_DATA_PREFIX
+# uvloop: libuv-based event loop, typically 2-4x faster than CPython asyncio for
+# socket-heavy workloads like this API (every request awaits Redis). install()
+# must run before uvicorn creates the loop, hence at import time; optional so
+# development on platforms without uvloop wheels (e.g. Windows) still works.
+try:
+    import uvloop
+    uvloop.install()
+except ImportError:
+    pass
+
+from prometheus_client import make_asgi_app
+
+from core.redis.client import (
+    async_redis_client,
+    aget_analyzed_flashes_range,
+    ANALYZED_FLASHES_VERSION_KEY
+)
 
 # Get a logger for this module
 logger = logging.getLogger(__name__)
@@ -21,7 +37,10 @@ logging.basicConfig(level=logging.INFO)
 app = FastAPI(
     title="AI Stock Intelligence API",
     description="API for providing AI-analyzed stock market news flashes.",
-    version="0.2.2" # Incremented version
+    version="0.2.2", # Incremented version
+    # orjson serializes our dict-heavy responses in C instead of running the Python-level
+    # jsonable_encoder over every field, which otherwise dominates endpoint CPU.
+    default_response_class=ORJSONResponse
 )
 
 # CORS Configuration
@@ -39,27 +58,45 @@ app.add_middleware(
     allow_headers=["*"], # Allow all headers
 )
 
-# Add startup and shutdown events for the async_redis_client connection pool
-# /* Commenting out async_redis_client startup/shutdown events
-# @app.on_event("startup")
-# async def startup_event():
-#     try:
-#         await async_redis_client.ping()
-#         logger.info("Async Redis client connected and pinged successfully on startup.")
-#     except Exception as e:
-#         logger.error(f"Error connecting to async_redis_client on startup: {e}", exc_info=True)
-# 
-# @app.on_event("shutdown")
-# async def shutdown_event():
-#     await async_redis_client.close()
-#     logger.info("Async Redis client connection closed on shutdown.")
-# */
+# Compress large JSON pages when the client advertises Accept-Encoding: gzip.
+# minimum_size skips tiny responses (and 304s) where compression costs more than
+# it saves; level 5 is close to gzip's best ratio at a fraction of level 9's CPU.
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+
+# Prometheus scrape endpoint; metric definitions live in core/metrics.py.
+# LLM/抓取相关指标产生在 Celery worker 进程里，单靠本进程的默认 registry
+# 采不到。设置 PROMETHEUS_MULTIPROC_DIR（API 与 worker 共享同一目录）后，
+# prometheus_client 会把各进程的指标写入该目录的 mmap 文件，这里改用
+# MultiProcessCollector 聚合后暴露，/metrics 即可看到全部进程的指标。
+if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+    from prometheus_client import CollectorRegistry, multiprocess
+    _metrics_registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(_metrics_registry)
+    app.mount("/metrics", make_asgi_app(registry=_metrics_registry))
+else:
+    app.mount("/metrics", make_asgi_app())
+
+# Startup and shutdown events for the async_redis_client connection pool
+@app.on_event("startup")
+async def startup_event():
+    try:
+        await async_redis_client.ping()
+        logger.info("Async Redis client connected and pinged successfully on startup.")
+    except Exception as e:
+        logger.error(f"Error connecting to async_redis_client on startup: {e}", exc_info=True)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await async_redis_client.close()
+    logger.info("Async Redis client connection closed on shutdown.")
 
 @app.get("/flashes/latest/", 
             response_model=List[Dict[str, Any]],
             summary="Get AI-analyzed financial news flashes from the last 24 hours",
             description="Retrieves a paginated list of AI-analyzed financial news flashes published within the last 24 hours, sorted by publication time in descending order. Flashes without AI analysis are excluded.")
 async def get_latest_flashes(
+    request: Request,
+    response: Response,
     skip: int = Query(0, ge=0, description="Number of items to skip for pagination based on AI-analyzed flashes"),
     limit: int = Query(10, ge=1, le=100, description="Number of AI-analyzed items to return per page (max 100)")
 ) -> List[Dict[str, Any]]:
@@ -67,34 +104,21 @@ async def get_latest_flashes(
         current_server_time_unix = time.time()
         twenty_four_hours_ago_unix = current_server_time_unix - (24 * 60 * 60)
 
-        # Fetch a potentially larger batch of IDs to account for filtering
-        # This is a simple approach; more complex pagination might be needed for very sparse analyzed data
-        # Let's fetch up to (skip + limit + buffer_for_filtering), e.g., limit*2 or fixed like 50-100, then filter
-        # For now, we will fetch IDs based on time window and then filter. 
-        # The actual number of items returned might be less than 'limit'.
-        
-        # Step 1: Get all flash IDs from the last 24 hours. We won't paginate IDs here yet.
-        all_flash_ids_in_24h = redis_client.zrevrangebyscore(
-            ALL_FLASHES_BY_TIME_KEY,
-            max='+inf',
-            min=twenty_four_hours_ago_unix
-        )
-        # No start/num here, get all then filter and paginate in Python. More robust for filtering.
-
-        if not all_flash_ids_in_24h:
-            return []
-        
-        analyzed_flashes_in_24h = []
-        for flash_id_str in all_flash_ids_in_24h: 
-            flash_data = get_flash_data(flash_id_str) 
-            if flash_data and 'llm_analysis' in flash_data: # Crucial check here
-                analyzed_flashes_in_24h.append(flash_data)
-            # else: flash is either not found or hasn't been analyzed yet - skip it
-        
-        # Step 2: Apply pagination (skip, limit) to the list of *analyzed* flashes
-        paginated_flashes = analyzed_flashes_in_24h[skip : skip + limit]
-        
-        return paginated_flashes
+        # The analyzed-set version only moves when the LLM task mutates the index, so
+        # (version, skip, limit) pins the response body. A matching If-None-Match lets
+        # us answer 304 before touching the ZSET or serializing anything.
+        analyzed_version = (await async_redis_client.get(ANALYZED_FLASHES_VERSION_KEY) or b"0").decode()
+        etag = f'W/"{analyzed_version}-{skip}-{limit}"'
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304)
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = "public, max-age=30, stale-while-revalidate=60"
+
+        # One Lua call walks the analyzed index with skip/limit and gathers the payloads
+        # server-side: a single round trip for the whole page. Hot entries are decoded
+        # from the in-process cache rather than re-parsed. Awaiting here keeps the
+        # event loop free to serve other requests during the Redis round trip.
+        return await aget_analyzed_flashes_range(twenty_four_hours_ago_unix, skip, limit)
 
     except Exception as e:
         logger.error(f"Error retrieving latest AI-analyzed flashes (last 24h): {e}", exc_info=True)
@@ -39,6 +39,17 @@ app.conf.update(
 #     },
 # }
 
+# Prometheus 多进程模式：worker 子进程退出时归并其指标文件，
+# 防止 PROMETHEUS_MULTIPROC_DIR 中的 .db 文件随进程重启无限累积。
+# （指标写入本身由 prometheus_client 在该环境变量存在时自动切换，无需额外代码。）
+if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+    from celery.signals import worker_process_shutdown
+    from prometheus_client import multiprocess
+
+    @worker_process_shutdown.connect
+    def _mark_prometheus_process_dead(pid=None, **kwargs):
+        multiprocess.mark_process_dead(pid)
+
 if __name__ == '__main__':
     # 以下命令用于启动 Celery 服务 (在项目根目录下运行):
     # 启动 Celery Worker (处理任务):
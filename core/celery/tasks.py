@@ -1,4 +1,8 @@
 # tasks.py
+import asyncio
+import os
+import time
+from collections import defaultdict
 from datetime import datetime, timezone
 
 from core.celery.celery_setup import app # 导入Celery app实例
@@ -7,8 +11,12 @@ from core.redis.client import (
     SINA_LIVE_FLASHES_LAST_PROCESSED_ID_KEY,
     SYMBOL_FLASHES_PREFIX,
     ALL_FLASHES_BY_TIME_KEY, # 导入新的 Key
+    ANALYZED_FLASHES_BY_TIME_KEY, # 仅含已分析快讯的时间索引
+    ANALYZED_FLASHES_VERSION_KEY, # 已分析集合的版本号，用于 API 的 ETag
     get_flash_data, # 显式导入辅助函数
-    store_flash_data, # 显式导入辅助函数
+    store_flash_batch, # 整批快讯一次 pipeline 往返写入
+    add_to_time_index_batch, # 多成员 ZADD 批量维护时间索引
+    store_flash_analysis, # LLM 分析结果独立写入，不回写快讯主体
     DEFAULT_EXPIRATION_SECONDS
 )
 from core.news_sources.sina_live_client import get_sina_live_flashes
@@ -17,6 +25,20 @@ from core.llm.interface import get_flash_analysis_from_llm, MODEL_ENDPOINT_ID #
 
 logger = get_task_logger(__name__)
 
+def _publish_ts_from_iso(publish_ts_str: str | None) -> float | None:
+    """
+    将 'YYYY-MM-DDTHH:MM:SS(Z)' 形式的 UTC 时间字符串解析为 Unix 时间戳。
+    解析失败或入参为空时返回 None。末尾的 'Z' 在此统一处理，调用方无需关心。
+    """
+    if not publish_ts_str:
+        return None
+    try:
+        if publish_ts_str.endswith('Z'):
+            publish_ts_str = publish_ts_str[:-1]
+        return datetime.fromisoformat(publish_ts_str).replace(tzinfo=timezone.utc).timestamp()
+    except ValueError:
+        return None
+
 # --- Celery Beat Schedule (定时任务规则) ---
 # 此处定义的 schedule 会在 Celery Beat 服务启动时被加载。
 # 也可以在 celery_app.py 中定义，或通过命令行参数传递给 beat 服务。
@@ -26,6 +48,10 @@ app.conf.beat_schedule = {
         'schedule': 60.0,  # 每 60 秒执行一次
         # 'args': (arg1, arg2), # 如果任务需要固定参数，可以在这里指定
     },
+    'trim-flash-time-indexes-hourly': {
+        'task': 'core.celery.tasks.trim_old_flash_index',
+        'schedule': 3600.0,  # 每小时修剪一次时间索引
+    },
 }
 # Celery Beat 时区默认使用在 celery_app.py 中 app.conf.timezone 定义的时区。
 
@@ -58,75 +84,104 @@ def fetch_sina_live_flashes_and_store(self):
 
         processed_count = 0
         actual_new_latest_api_id = last_processed_api_id
-        tasks_to_chain = []
+        flash_ids_to_analyze = []
 
-        with redis_client.pipeline() as pipe:
-            for flash_item in new_flashes: # new_flashes 是已经转换和筛选过的标准格式列表
-                flash_id_str = flash_item.get("flash_id")
-                if not flash_id_str:
-                    logger.warning(f"跳过一个没有flash_id的快讯项: {flash_item.get('content', '')[:50]}...")
-                    continue
-                
-                # 存储快讯数据
-                store_flash_data(flash_id_str, flash_item, pipeline=pipe, expiration_seconds=DEFAULT_EXPIRATION_SECONDS)
-
-                # 将 flash_id 添加到全局按时间排序的 Sorted Set
-                try:
-                    publish_ts_str = flash_item.get("publish_timestamp_utc")
-                    if publish_ts_str:
-                        # 转换ISO格式时间字符串为 Unix 时间戳 (float)
-                        # 移除末尾的 'Z' (如果存在)，因为 fromisoformat 不直接处理它，但通常表示UTC
-                        if publish_ts_str.endswith('Z'):
-                            publish_ts_str = publish_ts_str[:-1]
-                        dt_object = datetime.fromisoformat(publish_ts_str).replace(tzinfo=timezone.utc)
-                        publish_timestamp = dt_object.timestamp()
-                        pipe.zadd(ALL_FLASHES_BY_TIME_KEY, {flash_id_str: publish_timestamp})
-                    else:
-                        logger.warning(f"快讯 {flash_id_str} 缺少 publish_timestamp_utc，无法添加到 {ALL_FLASHES_BY_TIME_KEY}")
-                except ValueError as ve:
-                    logger.error(f"无法将 publish_timestamp_utc '{publish_ts_str}' 转换为时间戳 (快讯ID: {flash_id_str}): {ve}")
-                except Exception as e:
-                    logger.error(f"为快讯 {flash_id_str} 添加到 {ALL_FLASHES_BY_TIME_KEY} 时发生未知错误: {e}")
-
-                # 为关联股票创建/更新 Sorted Set 索引
-                if flash_item.get("associated_symbols"):
-                    for symbol_info in flash_item["associated_symbols"]:
-                        symbol_code = symbol_info.get("symbol")
-                        if symbol_code:
-                            symbol_key = f"{SYMBOL_FLASHES_PREFIX}{symbol_code}"
-                            # 使用快讯的发布时间戳作为 score
-                            if 'publish_timestamp' in locals(): # 确保 publish_timestamp 已成功转换
-                                pipe.zadd(symbol_key, {flash_id_str: publish_timestamp})
-                            else: # Fallback or log error if timestamp wasn't available for ALL_FLASHES_BY_TIME_KEY
-                                logger.warning(f"快讯 {flash_id_str} 因缺少有效时间戳，未添加到股票索引 {symbol_key}")
+        # 快讯数据与各时间索引的成员在循环中先累积，循环结束后整批通过
+        # 一个 pipeline 写入：SET 批量发出，每个索引键只有一条多成员 ZADD
+        flash_items_batch = []
+        all_flashes_batch = {}
+        symbol_batches = defaultdict(dict)
+
+        # 幂等性：任务重试或轮询窗口重叠时，同一批快讯可能再次出现。
+        # 一次 ZMSCORE 找出已入库的 ID——重复项只参与 last_id 推进，
+        # 不会重复 SET 数据，更不会再次触发昂贵的 LLM 分析。
+        candidate_ids = [f.get("flash_id") for f in new_flashes if f.get("flash_id")]
+        already_stored_ids = set()
+        if candidate_ids:
+            try:
+                scores = redis_client.zmscore(ALL_FLASHES_BY_TIME_KEY, candidate_ids)
+                already_stored_ids = {fid for fid, score in zip(candidate_ids, scores) if score is not None}
+            except Exception as e:
+                logger.warning(f"ZMSCORE 查重失败，按全部为新快讯处理: {e}")
+
+        for flash_item in new_flashes: # new_flashes 是已经转换和筛选过的标准格式列表
+            flash_id_str = flash_item.get("flash_id")
+            if not flash_id_str:
+                logger.warning(f"跳过一个没有flash_id的快讯项: {flash_item.get('content', '')[:50]}...")
+                continue
+
+            if flash_id_str in already_stored_ids:
+                # 重复快讯：只推进 last_processed_id，其余全部跳过
+                duplicate_api_id = flash_item.get("source_item_id")
+                if duplicate_api_id and (actual_new_latest_api_id is None or duplicate_api_id > actual_new_latest_api_id):
+                    actual_new_latest_api_id = duplicate_api_id
+                continue
+
+            # 发布时间只解析一次，并作为数值字段物化到快讯数据中，
+            # 下游（LLM分析任务维护已分析索引等）直接读取，无需重新解析字符串。
+            # 每轮迭代显式赋值（可能为 None），后续统一用 is not None 判断，
+            # 避免此前 'in locals()' 检查让上一轮的时间戳泄漏到解析失败的快讯上。
+            publish_timestamp = _publish_ts_from_iso(flash_item.get("publish_timestamp_utc"))
+            if publish_timestamp is not None:
+                flash_item["publish_ts"] = publish_timestamp
+
+            # 累积快讯数据，循环结束后整批写入
+            flash_items_batch.append((flash_id_str, flash_item))
+
+            # 将 flash_id 累积到全局按时间排序的 Sorted Set 批次
+            if publish_timestamp is not None:
+                all_flashes_batch[flash_id_str] = publish_timestamp
+            else:
+                logger.warning(f"快讯 {flash_id_str} 缺少有效的 publish_timestamp_utc，无法添加到 {ALL_FLASHES_BY_TIME_KEY}")
+
+            # 为关联股票累积 Sorted Set 索引成员
+            if flash_item.get("associated_symbols"):
+                for symbol_info in flash_item["associated_symbols"]:
+                    symbol_code = symbol_info.get("symbol")
+                    if symbol_code:
+                        symbol_key = f"{SYMBOL_FLASHES_PREFIX}{symbol_code}"
+                        # 使用快讯的发布时间戳作为 score
+                        if publish_timestamp is not None:
+                            symbol_batches[symbol_key][flash_id_str] = publish_timestamp
+                        else:
+                            logger.warning(f"快讯 {flash_id_str} 因缺少有效时间戳，未添加到股票索引 {symbol_key}")
                 
-                # 准备LLM分析任务链
-                tasks_to_chain.append(analyze_flash_with_llm_task.s(flash_id_str))
+            # 收集待分析的快讯ID，循环结束后整批派发一个分析任务
+            flash_ids_to_analyze.append(flash_id_str)
                 
-                processed_count += 1
-                current_api_id = flash_item.get("raw_api_response_item", {}).get("id")
-                if current_api_id:
-                    if actual_new_latest_api_id is None or current_api_id > actual_new_latest_api_id:
-                        actual_new_latest_api_id = current_api_id
+            processed_count += 1
+            current_api_id = flash_item.get("source_item_id")
+            if current_api_id:
+                if actual_new_latest_api_id is None or current_api_id > actual_new_latest_api_id:
+                    actual_new_latest_api_id = current_api_id
             
+
+        # 所有写操作共用一个 pipeline：整批 SET、每个索引键一条多成员 ZADD
+        # 和 last_processed_id 的更新在一次网络往返中完成。
+        # nx=True 兜底：即使 ZMSCORE 查重失败，已有成员的 score 也不会被改写。
+        with redis_client.pipeline() as pipe:
+            store_flash_batch(flash_items_batch, pipeline=pipe, expiration_seconds=DEFAULT_EXPIRATION_SECONDS)
+            add_to_time_index_batch(all_flashes_batch, pipeline=pipe, nx=True)
+            for symbol_key, symbol_members in symbol_batches.items():
+                add_to_time_index_batch(symbol_members, index_key=symbol_key, pipeline=pipe, nx=True)
+
             # 更新 SINA_LIVE_FLASHES_LAST_PROCESSED_ID_KEY
             # 使用本次处理的快讯中最大的API ID，或者API直接返回的批次最新ID（如果前者不可用或后者更大）
             final_id_to_store = actual_new_latest_api_id
             if batch_latest_api_id is not None:
                 if final_id_to_store is None or batch_latest_api_id > final_id_to_store:
                     final_id_to_store = batch_latest_api_id
-            
+
             if final_id_to_store is not None:
                  pipe.set(SINA_LIVE_FLASHES_LAST_PROCESSED_ID_KEY, str(final_id_to_store))
-            
+
             pipe.execute()
 
-        if tasks_to_chain:
-            # 使用 Celery chain 确保按顺序执行（如果需要，但这里每个任务独立，直接并发也可以）
-            # 为了简单起见，我们让它们并发执行，因为它们是独立的分析任务
-            for task_signature in tasks_to_chain:
-                task_signature.delay()
-            logger.info(f"成功处理并存储了 {processed_count} 条新快讯，并为它们创建了LLM分析任务。最新的API ID更新为: {final_id_to_store}")
+        if flash_ids_to_analyze:
+            # 整批快讯作为一条消息投递给批量分析任务：broker 只收到一条消息，
+            # 并发在任务内部用 asyncio 实现，不再为每条快讯付出一次 worker 调度
+            analyze_flash_batch_task.delay(flash_ids_to_analyze)
+            logger.info(f"成功处理并存储了 {processed_count} 条新快讯，并为它们创建了LLM批量分析任务。最新的API ID更新为: {final_id_to_store}")
         else:
             logger.info(f"处理了 {processed_count} 条快讯，但没有新的LLM任务需要触发。最新的API ID更新为: {final_id_to_store}")
             
@@ -141,95 +196,228 @@ def fetch_sina_live_flashes_and_store(self):
             logger.critical(f"任务 fetch_sina_live_flashes_and_store 达到最大重试次数，放弃执行。错误: {e}")
             return f"任务失败且达到最大重试次数: {e}"
 
-@app.task(bind=True, max_retries=2, default_retry_delay=30)
-def analyze_flash_with_llm_task(self, flash_id: str):
+@app.task
+def trim_old_flash_index():
     """
-    Celery 任务，用于对单个财经快讯进行LLM分析并存储结果。
+    Celery 定时任务：从各时间索引中移除超过数据保留期的成员。
+
+    快讯数据键本身带 TTL 会自动过期，但 Sorted Set 索引不会随之收缩，
+    skiplist 越大，每次范围查询要走的层级就越多。定期用 ZREMRANGEBYSCORE
+    将索引修剪到与数据保留期一致，既限制了索引规模，也避免索引中
+    残留指向已过期数据的悬空成员。
     """
+    cutoff = time.time() - DEFAULT_EXPIRATION_SECONDS
     try:
-        logger.info(f"[LLM分析任务] 开始分析快讯ID: {flash_id}")
-        flash_data = get_flash_data(flash_id)
+        removed = 0
+        removed += redis_client.zremrangebyscore(ALL_FLASHES_BY_TIME_KEY, '-inf', cutoff)
+        removed += redis_client.zremrangebyscore(ANALYZED_FLASHES_BY_TIME_KEY, '-inf', cutoff)
 
-        if not flash_data:
-            logger.error(f"[LLM分析任务] 无法从Redis获取快讯ID: {flash_id} 的数据。任务终止。")
-            return f"错误：无法获取快讯 {flash_id} 数据"
-        
-        content_to_analyze = flash_data.get("content")
-        if not content_to_analyze:
-            logger.warning(f"[LLM分析任务] 快讯ID: {flash_id} 内容为空，无法进行LLM分析。")
-            flash_data["llm_analysis"] = {
-                "success": False,
-                "error": "快讯内容为空",
-                "summary": None, "sentiment": None, "analysis_type": "general_news_no_analysis",
-                "stock_specific_analysis": None, "macro_analysis": None,
-                "llm_model_used": MODEL_ENDPOINT_ID
-            }
-            store_flash_data(flash_id, flash_data, expiration_seconds=DEFAULT_EXPIRATION_SECONDS)
-            return "快讯内容为空，已标记。"
-
-        # 获取关联股票信息传递给LLM接口
-        associated_symbols_for_llm = flash_data.get("associated_symbols", []) # 默认为空列表
-
-        logger.info(f"[LLM分析任务] 准备调用LLM分析快讯ID: {flash_id}，关联股票数: {len(associated_symbols_for_llm)}")
-        analysis_result = get_flash_analysis_from_llm(content_to_analyze, target_symbols=associated_symbols_for_llm)
-        logger.info(f"[LLM分析任务] 快讯ID: {flash_id} LLM分析原始结果: {analysis_result}")
-
-        # 将LLM分析结果（整个字典）存入原快讯数据的 llm_analysis 字段
-        flash_data["llm_analysis"] = {
-            **analysis_result, 
-            "llm_model_used": MODEL_ENDPOINT_ID, # 记录实际使用的模型
-            "analysis_timestamp_utc": datetime.now(timezone.utc).isoformat() # 记录分析时间
-        }
-
-        store_flash_data(flash_id, flash_data, expiration_seconds=DEFAULT_EXPIRATION_SECONDS)
-        
+        # 股票索引键数量不定，用 SCAN 渐进遍历（不会像 KEYS 一样阻塞 Redis），
+        # 修剪命令通过 pipeline 批量发出
+        with redis_client.pipeline(transaction=False) as pipe:
+            for symbol_key in redis_client.scan_iter(match=f"{SYMBOL_FLASHES_PREFIX}*", count=500):
+                pipe.zremrangebyscore(symbol_key, '-inf', cutoff)
+            removed += sum(pipe.execute())
+
+        logger.info(f"时间索引修剪完成，共移除 {removed} 个过期成员。")
+        return f"已移除 {removed} 个过期索引成员。"
+    except Exception as e:
+        logger.error(f"任务 trim_old_flash_index 执行失败: {e}", exc_info=True)
+        return f"索引修剪失败: {e}"
+
+# 批量分析任务内的 LLM 并发度。LLM 调用是纯外部 HTTP I/O，
+# 并发上限主要受服务商速率限制约束，按需通过环境变量调整。
+LLM_BATCH_CONCURRENCY = int(os.environ.get('LLM_BATCH_CONCURRENCY', '8'))
+
+def _analyze_and_store_flash(flash_id: str) -> str:
+    """
+    对单条快讯执行 LLM 分析并把结果写回 Redis。
+    analyze_flash_with_llm_task 与 analyze_flash_batch_task 共用的核心逻辑；
+    异常向上抛出，由调用方决定重试策略。
+    """
+    logger.info(f"[LLM分析任务] 开始分析快讯ID: {flash_id}")
+    flash_data = get_flash_data(flash_id)
+
+    if not flash_data:
+        logger.error(f"[LLM分析任务] 无法从Redis获取快讯ID: {flash_id} 的数据。任务终止。")
+        return f"错误：无法获取快讯 {flash_id} 数据"
+
+    # 幂等性保护：LLM 调用是整个系统中最昂贵的操作。
+    # 重复派发、broker 消息重放或"成功但后续步骤失败"的重试都会再次进入这里，
+    # 已有成功分析结果时直接返回，不再调用模型。
+    if (flash_data.get("llm_analysis") or {}).get("success"):
+        logger.info(f"[LLM分析任务] 快讯 {flash_id} 已有成功的分析结果，跳过重复分析。")
+        return f"快讯 {flash_id} 已分析，跳过。"
+
+    # 分布式锁兜底：防止两个 worker 同时分析同一条快讯（NX + 10分钟过期）
+    if not redis_client.set(f"llm_lock:{flash_id}", "1", nx=True, ex=600):
+        logger.info(f"[LLM分析任务] 快讯 {flash_id} 正在被其他 worker 分析，跳过。")
+        return f"快讯 {flash_id} 已有分析任务在执行，跳过。"
+
+    try:
+        return _analyze_and_store_flash_locked(flash_id, flash_data)
+    except Exception:
+        # 异常时主动释放锁：否则重试/重新派发的任务在锁过期前（最长10分钟）
+        # 都会因"已有分析任务在执行"被跳过，相当于把失败静默吞掉。
+        try:
+            redis_client.delete(f"llm_lock:{flash_id}")
+        except Exception as lock_e:
+            logger.warning(f"[LLM分析任务] 释放快讯 {flash_id} 的分析锁失败: {lock_e}")
+        raise
+
+def _analyze_and_store_flash_locked(flash_id: str, flash_data: dict) -> str:
+    """_analyze_and_store_flash 持有分析锁之后的主体逻辑。"""
+    content_to_analyze = flash_data.get("content")
+    if not content_to_analyze:
+        logger.warning(f"[LLM分析任务] 快讯ID: {flash_id} 内容为空，无法进行LLM分析。")
+        store_flash_analysis(flash_id, {
+            "success": False,
+            "error": "快讯内容为空",
+            "summary": None, "sentiment": None, "analysis_type": "general_news_no_analysis",
+            "stock_specific_analysis": None, "macro_analysis": None,
+            "llm_model_used": MODEL_ENDPOINT_ID
+        }, expiration_seconds=DEFAULT_EXPIRATION_SECONDS)
+        return "快讯内容为空，已标记。"
+
+    # 获取关联股票信息传递给LLM接口
+    associated_symbols_for_llm = flash_data.get("associated_symbols", []) # 默认为空列表
+
+    logger.info(f"[LLM分析任务] 准备调用LLM分析快讯ID: {flash_id}，关联股票数: {len(associated_symbols_for_llm)}")
+    analysis_result = get_flash_analysis_from_llm(content_to_analyze, target_symbols=associated_symbols_for_llm)
+    logger.info(f"[LLM分析任务] 快讯ID: {flash_id} LLM分析原始结果: {analysis_result}")
+
+    # 分析结果写入独立的 flash_analysis:<id> 键（单条 SET），
+    # 不再把整条快讯读出-修改-写回，也避免了并发任务间的丢失更新
+    analysis_stored = store_flash_analysis(flash_id, {
+        **analysis_result,
+        "llm_model_used": MODEL_ENDPOINT_ID, # 记录实际使用的模型
+        "analysis_timestamp_utc": datetime.now(timezone.utc).isoformat() # 记录分析时间
+    }, expiration_seconds=DEFAULT_EXPIRATION_SECONDS)
+
+    # 分析键写入失败时绝不能把快讯加入已分析索引：API 端按索引直出数据，
+    # 会把一条没有 llm_analysis 的快讯当作已分析结果返回。
+    # 抛出异常交由调用方重试（成功结果已进精确缓存，重试不会再付一次 LLM 调用）。
+    if not analysis_stored:
+        raise RuntimeError(f"快讯 {flash_id} 的LLM分析结果写入 Redis 失败，留待重试。")
+
+    # 维护"已分析"时间索引：成功时加入，失败时移除。
+    # score 优先读取入库时物化的数值字段 publish_ts；
+    # 旧数据没有该字段时回退到 ALL_FLASHES_BY_TIME_KEY 中已存的分数。
+    try:
         if analysis_result.get("success"):
-            logger.info(f"[LLM分析任务] 快讯ID: {flash_id} 分析完成并成功存储。摘要: {analysis_result.get('summary')}, 类型: {analysis_result.get('analysis_type')}")
+            publish_score = flash_data.get("publish_ts")
+            if publish_score is None:
+                publish_score = redis_client.zscore(ALL_FLASHES_BY_TIME_KEY, flash_id)
+            if publish_score is not None:
+                redis_client.zadd(ANALYZED_FLASHES_BY_TIME_KEY, {flash_id: publish_score})
+                redis_client.incr(ANALYZED_FLASHES_VERSION_KEY)
+            else:
+                logger.warning(f"[LLM分析任务] 快讯 {flash_id} 不在 {ALL_FLASHES_BY_TIME_KEY} 中，无法加入已分析索引。")
         else:
-            logger.error(f"[LLM分析任务] 快讯ID: {flash_id} LLM分析失败或返回错误。错误: {analysis_result.get('error')}")
-        
-        # Publish the new/updated flash data to a Redis channel (No longer needed for polling)
-        # /* Commenting out Redis publish for SSE
-        # try:
-        #     flash_data_json_to_publish = json.dumps(flash_data, ensure_ascii=False)
-        #     logger.info(f"[LLM分析任务 DEBUG] 准备发布到 'new_flashes_channel' 的数据 (flash_id: {flash_id}): {flash_data_json_to_publish[:500]}...") # Log first 500 chars
-        # except Exception as json_e:
-        #     logger.error(f"[LLM分析任务 DEBUG] 序列化 flash_data (flash_id: {flash_id}) 到 JSON 失败: {json_e}")
-        #     flash_data_json_to_publish = None 
-        # 
-        # if flash_data_json_to_publish:
-        #     publish_count = redis_client.publish('new_flashes_channel', flash_data_json_to_publish)
-        #     logger.info(f"[LLM分析任务] 已将快讯 (flash_id: {flash_id}) 发布到频道 'new_flashes_channel'。接收者数量: {publish_count}.")
-        # else:
-        #     logger.warning(f"[LLM分析任务] 由于JSON序列化失败，未发布快讯 (flash_id: {flash_id}) 到 'new_flashes_channel'。")
-        # */
-        
-        return f"快讯 {flash_id} LLM分析处理完毕。"
-            
+            if redis_client.zrem(ANALYZED_FLASHES_BY_TIME_KEY, flash_id):
+                redis_client.incr(ANALYZED_FLASHES_VERSION_KEY)
+    except Exception as index_e:
+        logger.error(f"[LLM分析任务] 更新 {ANALYZED_FLASHES_BY_TIME_KEY} 失败 (快讯ID: {flash_id}): {index_e}")
+
+    if analysis_result.get("success"):
+        logger.info(f"[LLM分析任务] 快讯ID: {flash_id} 分析完成并成功存储。摘要: {analysis_result.get('summary')}, 类型: {analysis_result.get('analysis_type')}")
+    else:
+        logger.error(f"[LLM分析任务] 快讯ID: {flash_id} LLM分析失败或返回错误。错误: {analysis_result.get('error')}")
+    
+    # Publish the new/updated flash data to a Redis channel (No longer needed for polling)
+    # /* Commenting out Redis publish for SSE
+    # try:
+    #     flash_data_json_to_publish = json.dumps(flash_data, ensure_ascii=False)
+    #     logger.info(f"[LLM分析任务 DEBUG] 准备发布到 'new_flashes_channel' 的数据 (flash_id: {flash_id}): {flash_data_json_to_publish[:500]}...") # Log first 500 chars
+    # except Exception as json_e:
+    #     logger.error(f"[LLM分析任务 DEBUG] 序列化 flash_data (flash_id: {flash_id}) 到 JSON 失败: {json_e}")
+    #     flash_data_json_to_publish = None 
+    # 
+    # if flash_data_json_to_publish:
+    #     publish_count = redis_client.publish('new_flashes_channel', flash_data_json_to_publish)
+    #     logger.info(f"[LLM分析任务] 已将快讯 (flash_id: {flash_id}) 发布到频道 'new_flashes_channel'。接收者数量: {publish_count}.")
+    # else:
+    #     logger.warning(f"[LLM分析任务] 由于JSON序列化失败，未发布快讯 (flash_id: {flash_id}) 到 'new_flashes_channel'。")
+    # */
+    
+    return f"快讯 {flash_id} LLM分析处理完毕。"
+
+@app.task(bind=True, max_retries=2, default_retry_delay=30)
+def analyze_flash_with_llm_task(self, flash_id: str):
+    """
+    Celery 任务，用于对单个财经快讯进行LLM分析并存储结果。
+    """
+    try:
+        return _analyze_and_store_flash(flash_id)
     except Exception as e:
         logger.error(f"[LLM分析任务] 处理快讯ID {flash_id} 时发生意外错误: {e}", exc_info=True)
         try:
             raise self.retry(exc=e, countdown=30)
         except self.MaxRetriesExceededError:
             logger.critical(f"任务 analyze_flash_with_llm_task ({flash_id}) 达到最大重试次数，放弃执行。错误: {e}")
-            # 即使LLM分析失败，也尝试更新Redis中的记录，标记错误
+            # 即使LLM分析失败，也尝试写入错误标记（独立分析键，无需读出快讯主体）
             try:
-                flash_data_on_error = get_flash_data(flash_id)
-                if flash_data_on_error:
-                    flash_data_on_error["llm_analysis"] = {
-                        "success": False,
-                        "error": f"LLM任务达到最大重试次数: {str(e)}",
-                        "summary": None, "sentiment": None, "analysis_type": None,
-                        "stock_specific_analysis": None, "macro_analysis": None,
-                        "llm_model_used": MODEL_ENDPOINT_ID,
-                        "analysis_timestamp_utc": datetime.now(timezone.utc).isoformat()
-                    }
-                    store_flash_data(flash_id, flash_data_on_error, expiration_seconds=DEFAULT_EXPIRATION_SECONDS)
+                if store_flash_analysis(flash_id, {
+                    "success": False,
+                    "error": f"LLM任务达到最大重试次数: {str(e)}",
+                    "summary": None, "sentiment": None, "analysis_type": None,
+                    "stock_specific_analysis": None, "macro_analysis": None,
+                    "llm_model_used": MODEL_ENDPOINT_ID,
+                    "analysis_timestamp_utc": datetime.now(timezone.utc).isoformat()
+                }, expiration_seconds=DEFAULT_EXPIRATION_SECONDS):
+                    redis_client.zrem(ANALYZED_FLASHES_BY_TIME_KEY, flash_id)
                     logger.info(f"已为快讯 {flash_id} 标记LLM分析失败（重试耗尽）。")
             except Exception as inner_e:
                 logger.error(f"在LLM任务 ({flash_id}) 重试耗尽后尝试标记错误时再次失败: {inner_e}")
             return f"LLM分析任务 {flash_id} 失败且达到最大重试次数。"
 
+@app.task(bind=True, max_retries=2, default_retry_delay=30, acks_late=True)
+def analyze_flash_batch_task(self, flash_ids: list):
+    """
+    Celery 任务：对一批快讯并发执行 LLM 分析。
+
+    LLM 分析本质上是对外部 HTTP API 的 I/O 等待，为每条快讯单独投递一个
+    Celery 任务会额外付出 broker 序列化和 worker 进程调度的开销。
+    整批快讯作为一条消息投递到这里，在单个 worker 内通过 asyncio + 线程池
+    并发执行（get_flash_analysis_from_llm 是阻塞调用，放入线程以便重叠等待），
+    并发度由信号量限制在 LLM_BATCH_CONCURRENCY 以内，尊重服务商速率限制。
+    写回 Redis 的逻辑与单条任务完全一致（_analyze_and_store_flash）。
+    """
+    async def _run_batch():
+        semaphore = asyncio.Semaphore(LLM_BATCH_CONCURRENCY)
+
+        async def _analyze_one(flash_id: str):
+            async with semaphore:
+                return await asyncio.to_thread(_analyze_and_store_flash, flash_id)
+
+        return await asyncio.gather(
+            *(_analyze_one(flash_id) for flash_id in flash_ids),
+            return_exceptions=True
+        )
+
+    try:
+        results = asyncio.run(_run_batch())
+        failed_ids = [fid for fid, r in zip(flash_ids, results) if isinstance(r, Exception)]
+        for fid, r in zip(flash_ids, results):
+            if isinstance(r, Exception):
+                logger.error(f"[LLM批量分析] 快讯 {fid} 分析失败: {r}")
+        if failed_ids:
+            # gather(return_exceptions=True) 吞掉了单条异常，批级 retry 不会触发；
+            # 而入库侧的 ZMSCORE 查重又保证这些快讯不会被再次派发分析。
+            # 失败条目逐条转交单条分析任务，复用其真实的重试逻辑。
+            logger.warning(f"[LLM批量分析] {len(failed_ids)}/{len(flash_ids)} 条快讯分析失败，"
+                           f"已转交单条任务重试: {failed_ids}")
+            for fid in failed_ids:
+                analyze_flash_with_llm_task.delay(fid)
+        return f"批量分析完成：{len(flash_ids) - len(failed_ids)}/{len(flash_ids)} 成功。"
+    except Exception as e:
+        logger.error(f"[LLM批量分析] 批次执行失败 ({len(flash_ids)} 条): {e}", exc_info=True)
+        try:
+            raise self.retry(exc=e, countdown=30)
+        except self.MaxRetriesExceededError:
+            logger.critical(f"任务 analyze_flash_batch_task 达到最大重试次数，放弃执行。错误: {e}")
+            return f"批量分析任务失败且达到最大重试次数: {e}"
+
 # 如果您想直接运行此脚本来测试任务逻辑 (不通过 Celery worker，而是作为普通 Python 脚本)：
 if __name__ == '__main__':
     print("开始直接调用 fetch_sina_live_flashes_and_store 任务进行测试...")
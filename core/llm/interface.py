@@ -1,6 +1,20 @@
+import asyncio
+import hashlib
+import logging
 import os
-import json
-from openai import OpenAI, APIError, APITimeoutError
+import re
+import json # 仅用于 __main__ 的调试输出；热路径解析用 orjson
+import orjson
+import httpx
+from openai import OpenAI, AsyncOpenAI, APIError, APITimeoutError
+
+from core.llm.semantic_cache import semantic_cache
+from core.metrics import LLM_CALL_SECONDS, LLM_CACHE_RESULT, LLM_PARSE_FAIL
+from core.redis.client import redis_client
+
+# 懒格式化（%s 占位）：生产环境 INFO 级别下 DEBUG 日志完全不构造字符串，
+# 省掉原先每次调用都把数 KB 的 LLM 原始响应 f-string 出来的开销
+logger = logging.getLogger(__name__)
 
 # 从环境变量中获取 API Key
 VOLCANO_ENGINE_API_KEY = os.environ.get("VOLCANO_ENGINE_API_KEY")
@@ -8,13 +22,273 @@ VOLCANO_ENGINE_BASE_URL = "https://ark.cn-beijing.volces.com/api/v3"
 MODEL_ENDPOINT_ID = "deepseek-r1-250120"
 
 if not VOLCANO_ENGINE_API_KEY:
-    print("错误：环境变量 VOLCANO_ENGINE_API_KEY 未设置。请设置该环境变量后重试。")
+    logger.error("环境变量 VOLCANO_ENGINE_API_KEY 未设置。请设置该环境变量后重试。")
 
 client = OpenAI(
     api_key=VOLCANO_ENGINE_API_KEY,
     base_url=VOLCANO_ENGINE_BASE_URL,
 )
 
+# 异步客户端：LLM 调用是纯网络 I/O，批量分析时用它并发重叠多个请求的往返。
+# 显式传入限定连接池大小的 httpx.AsyncClient，复用 keep-alive 连接，
+# 并发扇出时连接数不会无界增长。
+async_client = AsyncOpenAI(
+    api_key=VOLCANO_ENGINE_API_KEY,
+    base_url=VOLCANO_ENGINE_BASE_URL,
+    http_client=httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=32, max_keepalive_connections=32),
+        timeout=60,
+    ),
+)
+
+# --- System Prompt（模块级常量，导入时构建一次） ---
+# 提示词与输入无关，此前每次调用都重建示例字典、做一次带缩进的 JSON
+# 序列化再拼接数千字符，纯属热路径上的重复开销。
+
+# 1. 期望的JSON输出结构的Python字典示例
+_EXAMPLE_JSON_OUTPUT_STRUCTURE = {
+    "suggested_title": "基于内容生成的吸引人标题（不超过20字）",
+    "summary": "快讯的简明摘要（不超过80字）",
+    "sentiment": "快讯的整体市场情绪（选项：积极, 中性, 消极）",
+    "analysis_type": "分析类型（选项：stock_specific, macroeconomic, general_news_no_analysis）",
+    "category": "快讯的分类（选项：重大先机, 行业趋势, 政策动态, 市场看点, 其他）",
+    "stock_specific_analysis": {
+        "analyzed_symbol": "被分析股票的代码（例如SZ000001）或 \"不适用\"",
+        "key_info_points": ["从快讯中提取的与该股票直接相关的核心信息点（1-3个）"] or ["信息不足"],
+        "potential_impact": "这些信息点可能对该股票产生的正面或负面影响的简述",
+        "attention_level": "综合关注度建议（选项：高度关注价值, 值得进一步观察, 影响有限或不明确, 注意潜在风险, 不适用）",
+        "reasoning": "给出上述股票分析的综合理由（不超过100字）"
+    }, # or null
+    "macro_analysis": {
+        "key_macro_points": ["从快讯中提取的核心宏观/行业信息点（1-3个）"] or ["信息不足"],
+        "potential_market_impact": "这些信息对整体市场或特定行业板块可能产生的影响的简述",
+        "outlook_tendency": "对宏观趋势或相关行业的展望倾向的描述（例如：整体积极, 关注XX行业机会, 短期谨慎, 政策驱动等）",
+        "reasoning": "给出上述宏观分析的综合理由（不超过100字）"
+    } # or null
+}
+# 将字典示例转换为紧凑 JSON 字符串：缩进和换行对模型理解结构没有帮助，
+# 却让每次调用多付出数百个输入 token（约占示例部分的一半）
+_EXAMPLE_JSON_STRING = orjson.dumps(_EXAMPLE_JSON_OUTPUT_STRUCTURE).decode()
+
+# 2. 构建 System Prompt，嵌入JSON示例字符串
+_SYSTEM_PROMPT_INTRO = "你是一位专业的财经分析助手。你的任务是基于提供的快讯内容和可能的关联股票信息，进行深入分析。"
+_SYSTEM_PROMPT_FORMAT_INSTRUCTION = "请严格按照以下JSON格式返回你的分析结果，确保JSON可以被直接解析，不要在JSON前后添加任何额外文本或Markdown标记："
+
+# 任务指令采用紧凑措辞：每次调用都要发送整段 system prompt，
+# 去掉重复的提醒句式后输入 token 约减半，语义规则保持不变
+_SYSTEM_PROMPT_TASKS = """---
+任务指令（所有文本输出使用中文）：
+1. suggested_title：不超过20字，准确反映核心内容，包含关键公司名/数据/政策信息，可用情感词增强可读性；股票变动类需含具体数字。
+2. summary：不超过80字的摘要。
+3. sentiment：从【积极, 中性, 消极】中选一。
+4. category 分类标准：
+   重大先机=可能带来重大投资机会或风险的消息（技术突破、高增长预期、业绩下滑、负面事件等）；
+   行业趋势=行业发展动态、市场分析、供需变化；
+   政策动态=宏观经济政策、行业法规、政府举措；
+   市场看点=其他值得关注的市场信息；
+   其他=以上皆不符。
+5. analysis_type 判定规则：
+   - 提供了"关联股票"列表 → stock_specific：选择最受影响的一只分析，stock_specific_analysis 必须是完整对象（子字段可为"信息不足"/"不适用"），macro_analysis 为 null。
+   - 无关联股票，或内容明显侧重宏观/政策/行业 → macroeconomic：macro_analysis 必须是完整对象，stock_specific_analysis 为 null。
+   - 内容简短模糊、缺乏具体财经数据/事件、无实质可解读信息（如行程预告、礼节性致辞）→ general_news_no_analysis：两个分析对象均为 null，但仍需给出 summary、sentiment、category。"""
+
+# 使用字符串加法显式拼接，并手动添加换行符
+_SYSTEM_PROMPT = _SYSTEM_PROMPT_INTRO + "\n" + \
+                 _SYSTEM_PROMPT_FORMAT_INSTRUCTION + "\n" + \
+                 _EXAMPLE_JSON_STRING + "\n" + \
+                 _SYSTEM_PROMPT_TASKS
+
+# system 消息同样复用（OpenAI 客户端序列化时不会修改它，无共享可变状态风险）
+_SYSTEM_MESSAGE = {"role": "system", "content": _SYSTEM_PROMPT}
+
+# 校验用合法取值集合：frozenset 提供 O(1) 成员判断
+_VALID_SENTIMENTS = frozenset(["积极", "中性", "消极"])
+_VALID_CATEGORIES = frozenset(["重大先机", "行业趋势", "政策动态", "市场看点", "其他"])
+_VALID_ANALYSIS_TYPES = frozenset(["stock_specific", "macroeconomic", "general_news_no_analysis"])
+_VALID_ATTENTION_LEVELS = frozenset(["高度关注价值", "值得进一步观察", "影响有限或不明确", "注意潜在风险", "不适用"])
+
+# --- 精确匹配缓存 ---
+# 语义缓存之前的第一道防线：完全相同的快讯（任务重试、broker 消息重放）
+# 用一次 O(1) 的 Redis GET 就能短路整个 LLM 路径，连嵌入计算都省掉。
+# blake2b 在纯 Python 标准库中比 md5/sha256 更快，16 字节摘要足以做缓存键。
+_EXACT_CACHE_PREFIX = "llm_exact:"
+_EXACT_CACHE_TTL_SECONDS = 7 * 86400
+
+def _exact_cache_key(flash_content: str, target_symbols: list[dict] | None) -> str:
+    """由快讯内容与排序后的关联股票代码计算精确缓存键。"""
+    text = flash_content + "|" + ",".join(sorted(s.get("symbol", "") for s in target_symbols or []))
+    return _EXACT_CACHE_PREFIX + hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+def _exact_cache_get(exact_key: str) -> dict | None:
+    """读取精确缓存。任何故障都按未命中处理，不影响主流程。"""
+    try:
+        cached = redis_client.get(exact_key)
+        return orjson.loads(cached) if cached is not None else None
+    except Exception as e:
+        logger.warning("LLM精确缓存读取失败，按未命中处理: %s", e)
+        return None
+
+def _exact_cache_set(exact_key: str, analysis: dict) -> None:
+    """写入精确缓存（仅成功结果）。失败只打印警告。"""
+    try:
+        redis_client.set(exact_key, orjson.dumps(analysis), ex=_EXACT_CACHE_TTL_SECONDS)
+    except Exception as e:
+        logger.warning("LLM精确缓存写入失败（不影响主流程）: %s", e)
+
+# Markdown 代码围栏匹配：response_format=json_object 下模型一般不会再输出围栏，
+# 这里仅作兜底清理，单次正则扫描取代原先的多段 startswith/切片判断。
+# 收尾围栏是可选的：流式路径在第一个完整 JSON 对象闭合处即断开，
+# 若模型确实输出了围栏，拿到的文本只有起始围栏而没有收尾围栏。
+_FENCE_RE = re.compile(r'^\s*```(?:json)?\s*\n?(.*?)\n?(?:```\s*)?$', re.S)
+
+_DEFAULT_ERROR_RESPONSE = {
+    "success": False,
+    "summary": None, "sentiment": None, "analysis_type": None, "category": None,
+    "stock_specific_analysis": None, "macro_analysis": None,
+    "suggested_title": None
+}
+
+def _stream_first_json(stream) -> str:
+    """
+    从流式 completion 中增量读取，直到收到第一个完整的顶层 JSON 对象即返回。
+    r1 这类推理模型在 JSON 之后偶尔还会继续输出内容，提前收到完整对象就
+    close() 掉流，既能省下尾部 token 的等待时间，也让服务端尽早停止生成。
+
+    用花括号深度扫描判断对象是否闭合；字符串字面量内部的花括号
+    （中文分析文本中常见）通过引号/转义状态机跳过，不计入深度。
+    """
+    parts = []
+    depth = 0
+    in_string = False
+    escaped = False
+    started = False
+    for chunk in stream:
+        delta = chunk.choices[0].delta.content if chunk.choices else None
+        if not delta:
+            continue
+        parts.append(delta)
+        for ch in delta:
+            if escaped:
+                escaped = False
+            elif in_string:
+                if ch == '\\':
+                    escaped = True
+                elif ch == '"':
+                    in_string = False
+            elif ch == '"':
+                in_string = True
+            elif ch == '{':
+                depth += 1
+                started = True
+            elif ch == '}':
+                depth -= 1
+                if started and depth == 0:
+                    return "".join(parts) # 对象已闭合，剩余流由调用方 close()
+    return "".join(parts) # 流自然结束（对象可能不完整，交由解析层报错）
+
+def _build_user_prompt(flash_content: str, target_symbols: list[dict] | None) -> str:
+    """根据快讯内容与关联股票构建 user 消息文本。"""
+    user_prompt_parts = [f"快讯内容：{flash_content}"]
+    if target_symbols and len(target_symbols) > 0:
+        user_prompt_parts.append("关联股票：")
+        for stock in target_symbols:
+            user_prompt_parts.append(f"- {stock.get('symbol', '未知代码')} ({stock.get('name', '未知名称')})")
+        user_prompt_parts.append("\n请重点分析上述关联股票中最受快讯影响的一只。")
+    else:
+        user_prompt_parts.append("（无特定关联股票，请侧重宏观、政策或行业层面的分析，如果适用）")
+    return "\n".join(user_prompt_parts)
+
+def _parse_llm_response(raw_response_content: str) -> dict:
+    """
+    清洗、解析并校验 LLM 的原始响应文本，返回标准结果字典。
+    同步与异步调用路径共用这一套逻辑，保证两边行为完全一致。
+    """
+    fence_match = _FENCE_RE.match(raw_response_content)
+    cleaned_response = (fence_match.group(1) if fence_match else raw_response_content).strip()
+
+    if not cleaned_response:
+        LLM_PARSE_FAIL.inc()
+        return {**_DEFAULT_ERROR_RESPONSE, "error": f"LLM响应在清理Markdown后为空: {raw_response_content}"}
+
+    try:
+        analysis_data = orjson.loads(cleaned_response)
+    except orjson.JSONDecodeError as e:
+        LLM_PARSE_FAIL.inc()
+        return {
+            **_DEFAULT_ERROR_RESPONSE,
+            "error": f"LLM响应JSON解析错误: {e}. 清理后尝试解析的内容: {cleaned_response}. 原始响应: {raw_response_content}"
+        }
+
+    summary = analysis_data.get("summary")
+    sentiment = analysis_data.get("sentiment")
+    analysis_type = analysis_data.get("analysis_type")
+    category = analysis_data.get("category")
+    suggested_title = analysis_data.get("suggested_title")
+
+    if not all([summary, sentiment, analysis_type, category]):
+        LLM_PARSE_FAIL.inc()
+        return {
+            **_DEFAULT_ERROR_RESPONSE,
+            "summary": summary, "sentiment": sentiment,
+            "analysis_type": analysis_type, "category": category,
+            "suggested_title": suggested_title,
+            "error": f"LLM返回的JSON缺少必要的顶层字段 (summary, sentiment, analysis_type, category)。响应: {cleaned_response}"
+        }
+
+    if sentiment not in _VALID_SENTIMENTS:
+        logger.warning("LLM返回的情绪标签 '%s' 不在预设范围 %s。", sentiment, sorted(_VALID_SENTIMENTS))
+
+    if category not in _VALID_CATEGORIES:
+        logger.warning("LLM返回的分类标签 '%s' 不在预设范围 %s。", category, sorted(_VALID_CATEGORIES))
+
+    if analysis_type not in _VALID_ANALYSIS_TYPES:
+        LLM_PARSE_FAIL.inc()
+        return {
+            **_DEFAULT_ERROR_RESPONSE, "summary": summary, "sentiment": sentiment, "analysis_type": analysis_type, "category": category,
+            "error": f"LLM返回的 analysis_type ('{analysis_type}') 无效。响应: {cleaned_response}"
+        }
+
+    stock_analysis_data = analysis_data.get("stock_specific_analysis")
+    macro_analysis_data = analysis_data.get("macro_analysis")
+
+    if analysis_type == "stock_specific":
+        if not isinstance(stock_analysis_data, dict):
+            # 即使是 '不适用' 的情况，也应该是一个包含 'analyzed_symbol': '不适用' 等信息的对象
+            # 如果这里为 null，但 analysis_type 是 stock_specific，说明LLM未完全遵循指示
+            LLM_PARSE_FAIL.inc()
+            return {
+                **_DEFAULT_ERROR_RESPONSE, "summary": summary, "sentiment": sentiment, "analysis_type": analysis_type, "category": category,
+                "error": f"当 analysis_type 为 stock_specific 时，stock_specific_analysis 必须是一个非null的对象。响应: {cleaned_response}"
+            }
+        # 确保 stock_analysis_data 内部字段也存在，即使是 "不适用" 或 "信息不足"
+        if not all(k in stock_analysis_data for k in ["analyzed_symbol", "key_info_points", "potential_impact", "attention_level", "reasoning"]):
+            logger.warning("stock_specific_analysis 对象缺少部分内部字段。响应: %s", stock_analysis_data)
+            # 可以选择报错或尝试填充默认值
+        elif stock_analysis_data.get("attention_level") not in _VALID_ATTENTION_LEVELS:
+             logger.warning("stock_specific_analysis.attention_level ('%s') 无效。", stock_analysis_data.get('attention_level'))
+
+    elif analysis_type == "macroeconomic":
+        if not isinstance(macro_analysis_data, dict):
+             LLM_PARSE_FAIL.inc()
+             return {
+                **_DEFAULT_ERROR_RESPONSE, "summary": summary, "sentiment": sentiment, "analysis_type": analysis_type, "category": category,
+                "error": f"当 analysis_type 为 macroeconomic 时，macro_analysis 必须是一个非null的对象。响应: {cleaned_response}"
+            }
+        if not all(k in macro_analysis_data for k in ["key_macro_points", "potential_market_impact", "outlook_tendency", "reasoning"]):
+             logger.warning("macro_analysis 对象缺少部分内部字段。响应: %s", macro_analysis_data)
+
+    return {
+        "success": True,
+        "error": None,
+        "summary": summary,
+        "sentiment": sentiment,
+        "analysis_type": analysis_type,
+        "category": category,
+        "stock_specific_analysis": stock_analysis_data if analysis_type == "stock_specific" else None,
+        "macro_analysis": macro_analysis_data if analysis_type == "macroeconomic" else None,
+        "suggested_title": suggested_title
+    }
+
 def get_flash_analysis_from_llm(flash_content: str, target_symbols: list[dict] | None = None) -> dict:
     """
     调用大语言模型分析财经快讯文本。
@@ -29,218 +303,152 @@ def get_flash_analysis_from_llm(flash_content: str, target_symbols: list[dict] |
         dict: 包含分析结果的字典。
     """
     if not VOLCANO_ENGINE_API_KEY:
-        return {
-            "success": False,
-            "error": "API Key未配置",
-            "summary": None,
-            "sentiment": None,
-            "analysis_type": None,
-            "category": None,
-            "stock_specific_analysis": None,
-            "macro_analysis": None,
-            "suggested_title": None
-        }
+        return {**_DEFAULT_ERROR_RESPONSE, "error": "API Key未配置"}
 
-    # 1. 定义期望的JSON输出结构的Python字典示例
-    example_json_output_structure = {
-        "suggested_title": "基于内容生成的吸引人标题（不超过20字）",
-        "summary": "快讯的简明摘要（不超过80字）",
-        "sentiment": "快讯的整体市场情绪（选项：积极, 中性, 消极）",
-        "analysis_type": "分析类型（选项：stock_specific, macroeconomic, general_news_no_analysis）",
-        "category": "快讯的分类（选项：重大先机, 行业趋势, 政策动态, 市场看点, 其他）",
-        "stock_specific_analysis": {
-            "analyzed_symbol": "被分析股票的代码（例如SZ000001）或 \"不适用\"",
-            "key_info_points": ["从快讯中提取的与该股票直接相关的核心信息点（1-3个）"] or ["信息不足"],
-            "potential_impact": "这些信息点可能对该股票产生的正面或负面影响的简述",
-            "attention_level": "综合关注度建议（选项：高度关注价值, 值得进一步观察, 影响有限或不明确, 注意潜在风险, 不适用）",
-            "reasoning": "给出上述股票分析的综合理由（不超过100字）"
-        }, # or null
-        "macro_analysis": {
-            "key_macro_points": ["从快讯中提取的核心宏观/行业信息点（1-3个）"] or ["信息不足"],
-            "potential_market_impact": "这些信息对整体市场或特定行业板块可能产生的影响的简述",
-            "outlook_tendency": "对宏观趋势或相关行业的展望倾向的描述（例如：整体积极, 关注XX行业机会, 短期谨慎, 政策驱动等）",
-            "reasoning": "给出上述宏观分析的综合理由（不超过100字）"
-        } # or null
-    }
-    # 将字典示例转换为格式化的JSON字符串
-    example_json_string = json.dumps(example_json_output_structure, indent=2, ensure_ascii=False)
-
-    # 2. 构建 System Prompt，嵌入JSON示例字符串
-    system_prompt_intro = "你是一位专业的财经分析助手。你的任务是基于提供的快讯内容和可能的关联股票信息，进行深入分析。"
-    system_prompt_format_instruction = "请严格按照以下JSON格式返回你的分析结果，确保JSON可以被直接解析，不要在JSON前后添加任何额外文本或Markdown标记："
-    
-    # 使用三重引号确保 task 指令部分的字符串完整性
-    system_prompt_tasks = """---
-任务指令：
-1. 生成标题：根据快讯内容，生成简洁有力、能够吸引读者注意的标题，不超过20字。
-   标题应具备以下特点：
-   - 准确反映快讯核心内容
-   - 包含关键的公司名称、数据或政策信息
-   - 使用适当的积极/消极情感词增强可读性
-   - 对于股票变动相关内容，应包含具体数字
-
-2. 生成摘要：对快讯内容进行总结，不超过80字。
-3. 判断情绪：评估快讯所传达的整体市场情绪，从【积极, 中性, 消极】中选择一个。
-4. 确定快讯分类：
-   对快讯进行分类，从以下选项中选择一个最匹配的：
-   - "重大先机"：可能带来重大投资机会的积极消息、技术突破、高增长预、潜在风险、业绩下滑、负面事件期等
-   - "行业趋势"：描述特定行业的发展动态、市场分析、供需变化等
-   - "政策动态"：关于宏观经济政策、行业法规、政府举措等的快讯
-   - "市场看点"：其他值得关注的市场信息
-   - "其他"：不属于以上任何明确分类的快讯
-5. 进行深度分析：
-   - 如果提供了明确的"关联股票"列表：选择其中最受快讯内容影响的一只股票进行分析。
-     设置 `analysis_type` 为 `stock_specific`。
-     填充 `stock_specific_analysis` 对象中的所有字段。`macro_analysis` 设为 `null`。
-     注意：当 `analysis_type` 为 `stock_specific` 时，`stock_specific_analysis` 字段必须是一个完整的对象，即使某些子字段内容为"信息不足"或"不适用"；`macro_analysis` 字段此时应为 `null`。
-   - 如果未提供"关联股票"列表，或者快讯内容明显更侧重于宏观经济、政策或广泛的行业趋势：
-     设置 `analysis_type` 为 `macroeconomic`。
-     填充 `macro_analysis` 对象中的所有字段。`stock_specific_analysis` 设为 `null`。
-     注意：当 `analysis_type` 为 `macroeconomic` 时，`macro_analysis` 字段必须是一个完整的对象，`stock_specific_analysis` 字段此时应为 `null`。
-   - 如果快讯内容非常简短、高度模糊、缺乏具体的财经数据/事件、纯属猜测/传闻且无明确影响对象，或者本质上不包含可供财经解读的实质信息（例如："某某将出席会议"，"市场情绪整体平稳"，"XX公司CEO发表新年致辞"等此类无法直接转化为投资参考或经济趋势判断的内容）：
-     设置 `analysis_type` 为 `general_news_no_analysis`。
-     此时，`stock_specific_analysis` 和 `macro_analysis` 字段必须为 `null`。
-     即便如此，也请尽可能提供对原始快讯的 `summary` 和 `sentiment`，以及 `category`。
-确保所有文本输出都使用中文。"""
-
-    # 使用字符串加法显式拼接，并手动添加换行符
-    system_prompt = system_prompt_intro + "\n" + \
-                    system_prompt_format_instruction + "\n" + \
-                    example_json_string + "\n" + \
-                    system_prompt_tasks
+    # 精确缓存：完全相同的快讯（重试/消息重放）一次 GET 直接返回
+    exact_key = _exact_cache_key(flash_content, target_symbols)
+    cached_analysis = _exact_cache_get(exact_key)
+    if cached_analysis is not None:
+        logger.debug("LLM精确缓存命中，跳过LLM调用。")
+        LLM_CACHE_RESULT.labels(result="exact_hit").inc()
+        return cached_analysis
 
-    user_prompt_parts = [f"快讯内容：{flash_content}"]
-    if target_symbols and len(target_symbols) > 0:
-        user_prompt_parts.append("关联股票：")
-        for stock in target_symbols:
-            user_prompt_parts.append(f"- {stock.get('symbol', '未知代码')} ({stock.get('name', '未知名称')})")
-        user_prompt_parts.append("\n请重点分析上述关联股票中最受快讯影响的一只。")
-    else:
-        user_prompt_parts.append("（无特定关联股票，请侧重宏观、政策或行业层面的分析，如果适用）")
-    
-    final_user_prompt = "\n".join(user_prompt_parts)
+    # 语义缓存：通讯社快讯大量重复转载，向量相似度达到阈值且关联股票
+    # 集合完全一致时，直接复用此前的分析结果，完全省去一次 LLM 调用。
+    cached_analysis = semantic_cache.lookup(flash_content, target_symbols)
+    if cached_analysis is not None:
+        logger.debug("语义缓存命中，跳过LLM调用。")
+        LLM_CACHE_RESULT.labels(result="semantic_hit").inc()
+        return cached_analysis
+
+    LLM_CACHE_RESULT.labels(result="miss").inc()
 
+    final_user_prompt = _build_user_prompt(flash_content, target_symbols)
     messages = [
-        {"role": "system", "content": system_prompt},
+        _SYSTEM_MESSAGE,
         {"role": "user", "content": final_user_prompt},
     ]
 
-    default_error_response = {
-        "success": False,
-        "summary": None, "sentiment": None, "analysis_type": None, "category": None,
-        "stock_specific_analysis": None, "macro_analysis": None,
-        "suggested_title": None
-    }
-
     try:
-        print(f"DEBUG: 正在向LLM发送请求。System prompt 长度: {len(system_prompt)}, User prompt 长度: {len(final_user_prompt)}")
-        
-        completion = client.chat.completions.create(
-            model=MODEL_ENDPOINT_ID,
-            messages=messages,
-            temperature=0.5, # 稍微提高一点，允许分析性任务有一定的灵活性
-        )
-        
-        raw_response_content = completion.choices[0].message.content
-        print(f"DEBUG: LLM原始响应：{raw_response_content}")
-
-        cleaned_response = raw_response_content.strip()
-        if cleaned_response.startswith("```json"):
-            if cleaned_response.startswith("```json\n"):
-                cleaned_response = cleaned_response[8:]
-            else:
-                cleaned_response = cleaned_response[7:]
-            if cleaned_response.endswith("```"):
-                cleaned_response = cleaned_response[:-3]
-            cleaned_response = cleaned_response.strip()
-        
-        if not cleaned_response:
-            return {**default_error_response, "error": f"LLM响应在清理Markdown后为空: {raw_response_content}"}
+        logger.debug("正在向LLM发送请求。System prompt 长度: %d, User prompt 长度: %d", len(_SYSTEM_PROMPT), len(final_user_prompt))
 
-        try:
-            analysis_data = json.loads(cleaned_response)
-        except json.JSONDecodeError as e:
-            return {
-                **default_error_response,
-                "error": f"LLM响应JSON解析错误: {e}. 清理后尝试解析的内容: {cleaned_response}. 原始响应: {raw_response_content}"
-            }
+        # 流式读取：拿到第一个完整 JSON 对象即提前断开，不等尾部 token
+        with LLM_CALL_SECONDS.time():
+            try:
+                stream = client.chat.completions.create(
+                    model=MODEL_ENDPOINT_ID,
+                    messages=messages,
+                    temperature=0.5, # 稍微提高一点，允许分析性任务有一定的灵活性
+                    response_format={"type": "json_object"}, # 约束模型直接输出裸 JSON，不带 Markdown 围栏
+                    stream=True,
+                )
+                try:
+                    raw_response_content = _stream_first_json(stream)
+                finally:
+                    stream.close()
+            except (APITimeoutError, APIError):
+                raise # API 层错误直接走下方统一处理
+            except Exception as stream_err:
+                # 流式传输本身出问题时回退到一次普通调用，不让优化路径影响可用性
+                logger.warning("流式读取LLM响应失败，回退到非流式调用: %s", stream_err)
+                completion = client.chat.completions.create(
+                    model=MODEL_ENDPOINT_ID,
+                    messages=messages,
+                    temperature=0.5,
+                    response_format={"type": "json_object"},
+                )
+                raw_response_content = completion.choices[0].message.content
+        # %s 懒格式化：INFO 级别下这条多 KB 的响应完全不进入字符串构造
+        logger.debug("LLM原始响应: %s", raw_response_content)
 
-        summary = analysis_data.get("summary")
-        sentiment = analysis_data.get("sentiment")
-        analysis_type = analysis_data.get("analysis_type")
-        category = analysis_data.get("category")
-        suggested_title = analysis_data.get("suggested_title")
+        final_result = _parse_llm_response(raw_response_content)
+        if final_result.get("success"):
+            # 只缓存成功的分析结果，失败响应不值得被相似快讯复用
+            _exact_cache_set(exact_key, final_result)
+            semantic_cache.store(flash_content, target_symbols, final_result)
+        return final_result
 
-        if not all([summary, sentiment, analysis_type, category]):
-            return {
-                **default_error_response, 
-                "summary": summary, "sentiment": sentiment, 
-                "analysis_type": analysis_type, "category": category,
-                "suggested_title": suggested_title,
-                "error": f"LLM返回的JSON缺少必要的顶层字段 (summary, sentiment, analysis_type, category)。响应: {cleaned_response}"
-            }
-        
-        valid_sentiments = ["积极", "中性", "消极"]
-        if sentiment not in valid_sentiments:
-            print(f"警告: LLM返回的情绪标签 '{sentiment}' 不在预设范围 {valid_sentiments}。")
+    except APITimeoutError as e:
+        return {**_DEFAULT_ERROR_RESPONSE, "error": f"LLM API调用超时: {e}"}
+    except APIError as e:
+        return {**_DEFAULT_ERROR_RESPONSE, "error": f"LLM API错误: {e.message} (状态码: {e.status_code})"}
+    except Exception as e:
+        return {**_DEFAULT_ERROR_RESPONSE, "error": f"调用LLM时发生未知错误: {str(e)}"}
 
-        valid_categories = ["重大先机", "行业趋势", "政策动态", "市场看点", "其他"]
-        if category not in valid_categories:
-            print(f"警告: LLM返回的分类标签 '{category}' 不在预设范围 {valid_categories}。")
+async def get_flash_analysis_from_llm_async(flash_content: str, target_symbols: list[dict] | None = None) -> dict:
+    """
+    get_flash_analysis_from_llm 的异步版本，供批量分析等需要并发扇出的
+    场景使用。提示词构建与响应解析逻辑与同步版本完全共用；
+    语义缓存的嵌入计算是 CPU 操作，放入线程以免阻塞事件循环。
+    """
+    if not VOLCANO_ENGINE_API_KEY:
+        return {**_DEFAULT_ERROR_RESPONSE, "error": "API Key未配置"}
 
-        valid_analysis_types = ["stock_specific", "macroeconomic", "general_news_no_analysis"]
-        if analysis_type not in valid_analysis_types:
-            return {
-                **default_error_response, "summary": summary, "sentiment": sentiment, "analysis_type": analysis_type, "category": category,
-                "error": f"LLM返回的 analysis_type ('{analysis_type}') 无效。响应: {cleaned_response}"
-            }
-            
-        stock_analysis_data = analysis_data.get("stock_specific_analysis")
-        macro_analysis_data = analysis_data.get("macro_analysis")
-
-        if analysis_type == "stock_specific":
-            if not isinstance(stock_analysis_data, dict):
-                # 即使是 '不适用' 的情况，也应该是一个包含 'analyzed_symbol': '不适用' 等信息的对象
-                # 如果这里为 null，但 analysis_type 是 stock_specific，说明LLM未完全遵循指示
-                return {
-                    **default_error_response, "summary": summary, "sentiment": sentiment, "analysis_type": analysis_type, "category": category,
-                    "error": f"当 analysis_type 为 stock_specific 时，stock_specific_analysis 必须是一个非null的对象。响应: {cleaned_response}"
-                }
-            valid_attention_levels = ["高度关注价值", "值得进一步观察", "影响有限或不明确", "注意潜在风险", "不适用"]
-            # 确保 stock_analysis_data 内部字段也存在，即使是 "不适用" 或 "信息不足"
-            if not all(k in stock_analysis_data for k in ["analyzed_symbol", "key_info_points", "potential_impact", "attention_level", "reasoning"]):
-                print(f"警告: stock_specific_analysis 对象缺少部分内部字段。响应: {stock_analysis_data}")
-                # 可以选择报错或尝试填充默认值
-            elif stock_analysis_data.get("attention_level") not in valid_attention_levels:
-                 print(f"警告: stock_specific_analysis.attention_level ('{stock_analysis_data.get('attention_level')}') 无效。")
-
-        elif analysis_type == "macroeconomic":
-            if not isinstance(macro_analysis_data, dict):
-                 return {
-                    **default_error_response, "summary": summary, "sentiment": sentiment, "analysis_type": analysis_type, "category": category,
-                    "error": f"当 analysis_type 为 macroeconomic 时，macro_analysis 必须是一个非null的对象。响应: {cleaned_response}"
-                }
-            if not all(k in macro_analysis_data for k in ["key_macro_points", "potential_market_impact", "outlook_tendency", "reasoning"]):
-                 print(f"警告: macro_analysis 对象缺少部分内部字段。响应: {macro_analysis_data}")
+    exact_key = _exact_cache_key(flash_content, target_symbols)
+    cached_analysis = await asyncio.to_thread(_exact_cache_get, exact_key)
+    if cached_analysis is not None:
+        logger.debug("LLM精确缓存命中，跳过LLM调用。")
+        LLM_CACHE_RESULT.labels(result="exact_hit").inc()
+        return cached_analysis
 
-        return {
-            "success": True,
-            "error": None,
-            "summary": summary,
-            "sentiment": sentiment,
-            "analysis_type": analysis_type,
-            "category": category,
-            "stock_specific_analysis": stock_analysis_data if analysis_type == "stock_specific" else None,
-            "macro_analysis": macro_analysis_data if analysis_type == "macroeconomic" else None,
-            "suggested_title": suggested_title
-        }
+    cached_analysis = await asyncio.to_thread(semantic_cache.lookup, flash_content, target_symbols)
+    if cached_analysis is not None:
+        logger.debug("语义缓存命中，跳过LLM调用。")
+        LLM_CACHE_RESULT.labels(result="semantic_hit").inc()
+        return cached_analysis
+
+    LLM_CACHE_RESULT.labels(result="miss").inc()
+
+    final_user_prompt = _build_user_prompt(flash_content, target_symbols)
+    messages = [
+        _SYSTEM_MESSAGE,
+        {"role": "user", "content": final_user_prompt},
+    ]
+
+    try:
+        with LLM_CALL_SECONDS.time():
+            completion = await async_client.chat.completions.create(
+                model=MODEL_ENDPOINT_ID,
+                messages=messages,
+                temperature=0.5,
+                response_format={"type": "json_object"},
+            )
+
+        final_result = _parse_llm_response(completion.choices[0].message.content)
+        if final_result.get("success"):
+            await asyncio.to_thread(_exact_cache_set, exact_key, final_result)
+            await asyncio.to_thread(semantic_cache.store, flash_content, target_symbols, final_result)
+        return final_result
 
     except APITimeoutError as e:
-        return {**default_error_response, "error": f"LLM API调用超时: {e}"}
+        return {**_DEFAULT_ERROR_RESPONSE, "error": f"LLM API调用超时: {e}"}
     except APIError as e:
-        return {**default_error_response, "error": f"LLM API错误: {e.message} (状态码: {e.status_code})"}
+        return {**_DEFAULT_ERROR_RESPONSE, "error": f"LLM API错误: {e.message} (状态码: {e.status_code})"}
     except Exception as e:
-        return {**default_error_response, "error": f"调用LLM时发生未知错误: {str(e)}"}
+        return {**_DEFAULT_ERROR_RESPONSE, "error": f"调用LLM时发生未知错误: {str(e)}"}
+
+async def batch_analyze_flashes(flashes: list[tuple[str, list[dict] | None]], max_concurrency: int = 8) -> list[dict]:
+    """
+    并发分析一批快讯。LLM 调用是纯网络等待，N 条快讯的往返相互重叠，
+    整批耗时约等于最慢的一条而非 N 条之和；并发度由信号量限制，
+    避免触碰服务商速率限制。
+
+    参数:
+        flashes: (flash_content, target_symbols) 二元组列表。
+        max_concurrency (int): 同时在途的 LLM 请求数上限。
+
+    返回:
+        list[dict]: 与输入顺序一一对应的分析结果列表。
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _analyze_one(flash_content: str, target_symbols: list[dict] | None) -> dict:
+        async with semaphore:
+            return await get_flash_analysis_from_llm_async(flash_content, target_symbols)
+
+    return await asyncio.gather(
+        *(_analyze_one(content, symbols) for content, symbols in flashes)
+    )
 
 if __name__ == '__main__':
     print("正在测试 LLM 接口 (增强版分析)...")
@@ -0,0 +1,146 @@
+# semantic_cache.py
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import faiss
+from sentence_transformers import SentenceTransformer
+
+from core.redis.client import redis_client
+
+logger = logging.getLogger(__name__)
+
+# 语义缓存参数：
+# - 相似度阈值 0.87（L2 归一化向量的内积即余弦相似度），低于该值视为不同快讯；
+# - 进程内索引最多保留 10000 条，超出后按 LRU 淘汰；
+# - 分析结果在 Redis 中保留 24 小时，与快讯的时效性一致。
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+SIMILARITY_THRESHOLD = 0.87
+MAX_CACHE_ENTRIES = 10000
+CACHE_TTL_SECONDS = 86400
+LLM_CACHE_PREFIX = "llm_cache:"
+
+# 近邻检索候选数：取 top-k 后再做股票集合的精确过滤，
+# 避免"内容相似但关联股票不同"的快讯错误复用分析结果。
+_SEARCH_TOP_K = 5
+
+
+def _symbols_key(target_symbols: list[dict] | None) -> str:
+    """将关联股票列表规整为与顺序无关的字符串键。"""
+    if not target_symbols:
+        return ""
+    return ",".join(sorted(s.get("symbol", "") for s in target_symbols))
+
+
+class SemanticCache:
+    """
+    LLM 分析结果的语义缓存。
+
+    通讯社快讯大量存在转载和小幅改写，逐条调用 LLM 是重复开销。
+    每条已分析快讯的文本（内容 + 排序后的关联股票代码）经
+    all-MiniLM-L6-v2 编码为 384 维向量存入进程内 FAISS 索引，
+    分析结果 JSON 以内容哈希为键存入 Redis（带 TTL）。
+    查询时先做向量近邻检索，再对候选做关联股票集合的精确比对——
+    只有股票集合完全一致且相似度达到阈值才算命中。
+
+    嵌入模型在首次使用时才加载，避免拖慢 API 进程等不调用 LLM
+    的场景的导入时间。所有公开方法内部捕获异常并返回未命中/不存储，
+    缓存故障绝不影响 LLM 主路径。
+    """
+
+    def __init__(self,
+                 threshold: float = SIMILARITY_THRESHOLD,
+                 max_entries: int = MAX_CACHE_ENTRIES,
+                 ttl_seconds: int = CACHE_TTL_SECONDS):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._model = None
+        # IndexIDMap 包装 IndexFlatIP，使 LRU 淘汰时可以按 ID 移除向量
+        self._index = faiss.IndexIDMap(faiss.IndexFlatIP(384))
+        # 进程内条目表：faiss_id -> (redis哈希键后缀, 股票集合键)，按 LRU 排序
+        self._entries: OrderedDict[int, tuple[str, str]] = OrderedDict()
+        self._next_id = 0
+        # 批量分析任务会从多个线程并发进入，FAISS 的增删不是线程安全的
+        self._lock = threading.Lock()
+
+    def _get_model(self) -> SentenceTransformer:
+        if self._model is None:
+            self._model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+        return self._model
+
+    def _embed(self, text: str) -> np.ndarray:
+        """编码为 L2 归一化的 float32 向量，内积即余弦相似度。"""
+        vector = self._get_model().encode([text], normalize_embeddings=True)
+        return np.asarray(vector, dtype=np.float32)
+
+    @staticmethod
+    def _cache_text(flash_content: str, target_symbols: list[dict] | None) -> tuple[str, str]:
+        symbols_key = _symbols_key(target_symbols)
+        return f"{flash_content}|{symbols_key}", symbols_key
+
+    def lookup(self, flash_content: str, target_symbols: list[dict] | None = None) -> dict | None:
+        """
+        查询语义缓存。命中时返回缓存的分析结果字典，未命中返回 None。
+        """
+        try:
+            text, symbols_key = self._cache_text(flash_content, target_symbols)
+            with self._lock:
+                if not self._entries:
+                    return None
+                query_vector = self._embed(text)
+                scores, ids = self._index.search(query_vector, min(_SEARCH_TOP_K, len(self._entries)))
+                for score, faiss_id in zip(scores[0], ids[0]):
+                    if faiss_id < 0 or score < self.threshold:
+                        continue
+                    entry = self._entries.get(int(faiss_id))
+                    if entry is None:
+                        continue
+                    content_hash, cached_symbols_key = entry
+                    # 精确过滤：关联股票集合不一致时即使文本高度相似也不复用
+                    if cached_symbols_key != symbols_key:
+                        continue
+                    cached_json = redis_client.get(f"{LLM_CACHE_PREFIX}{content_hash}")
+                    if cached_json is None:
+                        # Redis 端已过期，进程内索引同步移除
+                        self._remove_entry(int(faiss_id))
+                        continue
+                    self._entries.move_to_end(int(faiss_id))
+                    return json.loads(cached_json)
+            return None
+        except Exception as e:
+            logger.warning("语义缓存查询失败，按未命中处理: %s", e)
+            return None
+
+    def store(self, flash_content: str, target_symbols: list[dict] | None, analysis: dict) -> None:
+        """
+        将一条成功的分析结果写入缓存（FAISS 向量 + Redis JSON）。
+        """
+        try:
+            text, symbols_key = self._cache_text(flash_content, target_symbols)
+            content_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+            payload = json.dumps(analysis, ensure_ascii=False)
+            with self._lock:
+                vector = self._embed(text)
+                faiss_id = self._next_id
+                self._next_id += 1
+                self._index.add_with_ids(vector, np.array([faiss_id], dtype=np.int64))
+                self._entries[faiss_id] = (content_hash, symbols_key)
+                while len(self._entries) > self.max_entries:
+                    oldest_id = next(iter(self._entries))
+                    self._remove_entry(oldest_id)
+            redis_client.set(f"{LLM_CACHE_PREFIX}{content_hash}", payload, ex=self.ttl_seconds)
+        except Exception as e:
+            logger.warning("语义缓存写入失败（不影响主流程）: %s", e)
+
+    def _remove_entry(self, faiss_id: int) -> None:
+        """从进程内索引移除一个条目。调用方须持有 self._lock。"""
+        self._entries.pop(faiss_id, None)
+        self._index.remove_ids(np.array([faiss_id], dtype=np.int64))
+
+
+# 模块级单例：每个 worker 进程共享一个索引
+semantic_cache = SemanticCache()
@@ -0,0 +1,44 @@
+# core/metrics.py
+"""
+Prometheus 指标定义（进程级单例，各模块直接导入使用）。
+
+指标本身不是优化，而是后续调优的前提：缓存命中率决定语义缓存阈值
+该调高还是调低，LLM 延迟分位数决定批量并发度，解析失败率反映提示词
+的稳定性。
+
+采集方式：LLM/抓取指标产生在 Celery worker 进程，API 进程的 /metrics
+默认看不到它们。部署时给 API 与 worker 设置同一个
+PROMETHEUS_MULTIPROC_DIR（容器间共享 volume），prometheus_client 会
+自动切换到多进程模式把指标写入该目录，app/main.py 中的 /metrics 端点
+再用 MultiProcessCollector 聚合暴露；worker 子进程退出时的清理见
+core/celery/celery_setup.py 的 worker_process_shutdown 信号。
+"""
+from prometheus_client import Counter, Histogram
+
+# LLM 单次调用耗时（仅真实调用，缓存命中不计入）。
+# 桶按推理模型的典型延迟范围设置。
+LLM_CALL_SECONDS = Histogram(
+    "llm_call_seconds",
+    "LLM API 调用耗时（秒）",
+    buckets=(0.5, 1, 2, 5, 10, 20, 30, 60),
+)
+
+# 缓存命中情况：result ∈ {exact_hit, semantic_hit, miss}。
+# exact_hit/semantic_hit 与 miss 之比即整体命中率。
+LLM_CACHE_RESULT = Counter(
+    "llm_cache_result_total",
+    "LLM 缓存查询结果计数",
+    labelnames=["result"],
+)
+
+# LLM 响应未能通过 JSON 解析或字段校验的次数
+LLM_PARSE_FAIL = Counter(
+    "llm_parse_fail_total",
+    "LLM 响应解析/校验失败计数",
+)
+
+# 新浪快讯 API 单次抓取耗时（含 HTTP 往返与 JSON 解析）
+SINA_FETCH_SECONDS = Histogram(
+    "sina_fetch_seconds",
+    "新浪快讯 API 抓取耗时（秒）",
+)
@@ -1,9 +1,17 @@
 # news_sources/sina_live_client.py
 
+import calendar
+import logging
 import requests
-import json
-from datetime import datetime
-import pytz # 用于时区处理
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import orjson # C 实现的 JSON 解析，API 整页 payload 和每条的 ext 字段都在热路径上
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo # stdlib 时区实现，.replace(tzinfo=...) 即可本地化，无 pytz 的 localize 开销
+
+from core.metrics import SINA_FETCH_SECONDS
+
+logger = logging.getLogger(__name__)
 
 # API 常量
 SINA_LIVE_API_URL = "https://zhibo.sina.com.cn/api/zhibo/feed"
@@ -11,12 +19,52 @@ ZHIBO_ID = 152  # 根据示例 URL
 API_TYPE = 1    # 根据示例 URL
 DEFAULT_PAGE_SIZE = 50 # 默认的每页条目数，一个合理的默认值
 
+# 模块级共享会话：keep-alive 复用 TCP+TLS 连接，轮询时不再为每次请求
+# 付出一次完整握手；502/503/504 等网关类瞬时错误做有限的自动退避重试。
+_SESSION = requests.Session()
+_SESSION.headers.update({"User-Agent": "firstMove/1.0", "Accept": "application/json"})
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=4,
+    max_retries=Retry(total=2, backoff_factor=0.3, status_forcelist=[502, 503, 504]),
+))
+
 # 定义中国标准时间 (CST) 时区
-CST = pytz.timezone('Asia/Shanghai')
+CST = ZoneInfo('Asia/Shanghai')
+
+# CST 自 1991 年起固定为 UTC+8（无夏令时），可以用常量偏移做整数运算
+_CST_UTC_OFFSET_SECONDS = 8 * 3600
+
+# 日期部分 -> 当日零点的 UTC 纪元秒。一批快讯几乎全部落在同一两天内，
+# 记忆化后每个条目只剩三段时分秒的整数解析。
+_date_epoch_cache: dict[str, int] = {}
+
+def _cst_str_to_utc_iso(create_time_str: str) -> str:
+    """
+    将固定格式 'YYYY-MM-DD HH:MM:SS' 的 CST 时间字符串转换为
+    UTC ISO-8601 字符串（'...Z' 结尾）。
+
+    按固定偏移做手工整数解析，绕开 strptime 每次的格式串解释开销；
+    格式不符时抛出 ValueError，由调用方的条目级异常处理决定跳过。
+    """
+    date_part = create_time_str[:10]
+    day_epoch = _date_epoch_cache.get(date_part)
+    if day_epoch is None:
+        year, month, day = int(date_part[0:4]), int(date_part[5:7]), int(date_part[8:10])
+        day_epoch = calendar.timegm((year, month, day, 0, 0, 0))
+        if len(_date_epoch_cache) > 64: # 轮询场景下极少触发，防御性上限
+            _date_epoch_cache.clear()
+        _date_epoch_cache[date_part] = day_epoch
+    seconds_in_day = (int(create_time_str[11:13]) * 3600
+                      + int(create_time_str[14:16]) * 60
+                      + int(create_time_str[17:19]))
+    utc_ts = day_epoch + seconds_in_day - _CST_UTC_OFFSET_SECONDS
+    return datetime.fromtimestamp(utc_ts, timezone.utc).isoformat(timespec='seconds').replace('+00:00', 'Z')
 
 def get_sina_live_flashes(
     last_processed_id: int | None = None,
-    page_size: int = DEFAULT_PAGE_SIZE
+    page_size: int = DEFAULT_PAGE_SIZE,
+    include_raw: bool = False
 ) -> tuple[list[dict], int | None]:
     """
     从新浪财经直播API获取最新的财经快讯。
@@ -25,6 +73,11 @@ def get_sina_live_flashes(
         last_processed_id (int | None): 上次成功处理的最新一条快讯的 ID。
                                         如果为 None，则获取所有能获取到的最新快讯。
         page_size (int): 每次API调用希望获取的条目数。
+        include_raw (bool): True 时在每条快讯中保留原始 API 条目
+                            (raw_api_response_item)，仅供调试；默认不保留，
+                            避免整页 api_data 被引用驻留、快讯对象和下游
+                            Redis payload 无谓膨胀。原始条目 ID 始终通过
+                            source_item_id 字段提供。
 
     返回:
         tuple[list[dict], int | None]:
@@ -43,29 +96,42 @@ def get_sina_live_flashes(
     batch_latest_id: int | None = None
 
     try:
-        response = requests.get(SINA_LIVE_API_URL, params=params, timeout=10) # 10 秒超时
-        response.raise_for_status()  # 如果返回状态码为 4XX 或 5XX，则抛出 HTTPError
-        api_data = response.json()
+        with SINA_FETCH_SECONDS.time(): # 抓取耗时直方图：HTTP 往返 + 整页 JSON 解析
+            response = _SESSION.get(SINA_LIVE_API_URL, params=params, timeout=10) # 10 秒超时
+            response.raise_for_status()  # 如果返回状态码为 4XX 或 5XX，则抛出 HTTPError
+            api_data = orjson.loads(response.content) # 直接解析原始字节，跳过 requests 的编码探测
 
         if not api_data or api_data.get("result", {}).get("status", {}).get("code") != 0:
-            print(f"新浪财经直播 API 返回错误或非预期数据: {api_data.get('result', {}).get('status', {})}")
+            logger.error("新浪财经直播 API 返回错误或非预期数据: %s", api_data.get('result', {}).get('status', {}))
             return [], None
 
         feed_list = api_data.get("result", {}).get("data", {}).get("feed", {}).get("list", [])
         if not feed_list:
-            print("新浪财经直播 API：未找到任何快讯条目。")
+            logger.info("新浪财经直播 API：未找到任何快讯条目。")
             return [], None
 
         # feed_list 中的第一项是此批次中来自 API 的最新条目
         batch_latest_id = int(feed_list[0].get("id"))
 
+        # 抓取时间戳在整批内共享（同批条目的抓取时刻相差不到1秒），
+        # 挪出循环避免每个条目一次 datetime.now + 字符串格式化
+        crawl_timestamp_utc_str = datetime.now(timezone.utc).isoformat(timespec='seconds').replace('+00:00', 'Z')
+
+        # feed_list 按 id 降序排列：从头扫描，遇到第一条已处理过的条目即可停止。
+        # 常态轮询下一页 50 条里只有一两条是新的，旧条目连时间解析都不会发生。
+        if last_processed_id is not None:
+            new_items = []
+            for item in feed_list:
+                if int(item.get("id")) <= last_processed_id:
+                    break
+                new_items.append(item)
+        else:
+            new_items = feed_list
+
         # 反向迭代以首先处理较旧的条目，这样我们可以按时间顺序附加它们
-        for item in reversed(feed_list):
+        for item in reversed(new_items):
             current_item_id = int(item.get("id"))
 
-            if last_processed_id is not None and current_item_id <= last_processed_id:
-                continue # 跳过已处理的条目
-
             try:
                 # 1. 内容 (rich_text 通常已被 response.json() 解码)
                 content = item.get("rich_text", "")
@@ -74,16 +140,12 @@ def get_sina_live_flashes(
                 create_time_str = item.get("create_time") # 例如: "2025-05-14 16:33:56"
                 publish_timestamp_utc_str = None
                 if create_time_str:
-                    dt_cst = datetime.strptime(create_time_str, "%Y-%m-%d %H:%M:%S")
-                    dt_aware_cst = CST.localize(dt_cst)
-                    dt_utc = dt_aware_cst.astimezone(pytz.utc)
-                    publish_timestamp_utc_str = dt_utc.isoformat(timespec='seconds').replace('+00:00', 'Z')
+                    publish_timestamp_utc_str = _cst_str_to_utc_iso(create_time_str)
 
-                # 3. 抓取时间戳
-                crawl_timestamp_utc_str = datetime.now(pytz.utc).isoformat(timespec='seconds').replace('+00:00', 'Z')
+                # 3. 抓取时间戳已在循环外统一计算 (crawl_timestamp_utc_str)
 
-                # 4. 标签
-                tags = [tag.get("name") for tag in item.get("tag", []) if tag.get("name")]
+                # 4. 标签（海象表达式：每个 tag 只做一次 .get，空元组兜底避免临时列表分配）
+                tags = [name for tag in item.get("tag", ()) if (name := tag.get("name"))]
 
                 # 5. 从 'ext' 字段获取关联股票和详情链接
                 associated_symbols = []
@@ -92,30 +154,30 @@ def get_sina_live_flashes(
                 ext_str = item.get("ext")
                 if ext_str:
                     try:
-                        ext_data = json.loads(ext_str) # 'ext' 本身是一个 JSON 字符串
+                        ext_data = orjson.loads(ext_str) # 'ext' 本身是一个 JSON 字符串
                         if isinstance(ext_data.get("stocks"), list):
-                            for stock_info in ext_data["stocks"]:
-                                market = stock_info.get("market")
-                                symbol_raw = stock_info.get("symbol")
-                                name = stock_info.get("key") # 公司名称/标识
-                                if market and symbol_raw:
-                                    # 标准化股票代码: 例如 sz002651 -> SZ002651
-                                    std_symbol = symbol_raw.upper()
-                                    associated_symbols.append({
-                                        "market": market,
-                                        "symbol": std_symbol,
-                                        "name": name
-                                    })
+                            # 单个列表推导完成过滤与标准化（例如 sz002651 -> SZ002651），
+                            # market/symbol 各只取一次
+                            associated_symbols = [
+                                {
+                                    "market": market,
+                                    "symbol": symbol_raw.upper(),
+                                    "name": stock_info.get("key") # 公司名称/标识
+                                }
+                                for stock_info in ext_data["stocks"]
+                                if (market := stock_info.get("market")) and (symbol_raw := stock_info.get("symbol"))
+                            ]
                         # 如果 ext 中有 docurl，优先使用它
                         if ext_data.get("docurl"):
                              detail_url = ext_data.get("docurl")
-                    except json.JSONDecodeError as je:
-                        print(f"处理快讯条目 ID {current_item_id} 时解析 ext 字段失败: {je}。ext 内容: '{ext_str[:100]}'...")
+                    except orjson.JSONDecodeError as je:
+                        logger.warning("处理快讯条目 ID %s 时解析 ext 字段失败: %s。ext 内容: '%s'...", current_item_id, je, ext_str[:100])
                         # ext字段解析失败不应阻止整个条目的处理，除非关键信息依赖它
                         # 这里我们选择继续，associated_symbols 可能为空，detail_url 可能为顶层URL
 
                 standardized_flash = {
                     "flash_id": f"sina_live_{current_item_id}",
+                    "source_item_id": current_item_id,
                     "content": content,
                     "publish_timestamp_utc": publish_timestamp_utc_str,
                     "crawl_timestamp_utc": crawl_timestamp_utc_str,
@@ -124,25 +186,26 @@ def get_sina_live_flashes(
                     "tags": tags,
                     "associated_symbols": associated_symbols,
                     "detail_url": detail_url,
-                    "raw_api_response_item": item # 用于调试或未来使用
                 }
+                if include_raw:
+                    standardized_flash["raw_api_response_item"] = item # 仅调试用
                 new_flashes_processed.append(standardized_flash)
 
             except Exception as e:
-                print(f"处理新浪财经直播 API 条目 ID {current_item_id} 时发生错误: {e}")
+                logger.error("处理新浪财经直播 API 条目 ID %s 时发生错误: %s", current_item_id, e)
                 # 可选: 如果此条目非常关键，可以考虑将其记录下来以供稍后检查
                 continue # 继续处理下一个条目
 
         return new_flashes_processed, batch_latest_id
 
     except requests.exceptions.RequestException as e:
-        print(f"从新浪财经直播 API 获取数据时发生网络请求错误: {e}")
-        return [], None 
-    except json.JSONDecodeError as e:
-        print(f"从新浪财经直播 API 解码 JSON 数据时发生错误: {e}")
-        return [], None 
+        logger.error("从新浪财经直播 API 获取数据时发生网络请求错误: %s", e)
+        return [], None
+    except orjson.JSONDecodeError as e:
+        logger.error("从新浪财经直播 API 解码 JSON 数据时发生错误: %s", e)
+        return [], None
     except Exception as e: # 捕获任何其他意外错误
-        print(f"在 get_sina_live_flashes 函数中发生未知错误: {e}")
+        logger.error("在 get_sina_live_flashes 函数中发生未知错误: %s", e)
         return [], None
 
 
@@ -2,16 +2,56 @@
 import redis
 import redis.asyncio as aioredis # Import for asyncio client
 import os
-import json # 主要用于 Celery 任务中序列化/反序列化数据，或直接存储复杂对象
+import threading
+import msgspec # MessagePack 编解码：二进制格式省去 JSON 的字符串转义与数字文本化开销
+import orjson # 仍用于解码历史 JSON 数据（见 _decode_payload）
+import zstandard as zstd # 快讯 payload 较大（原始内容 + llm_analysis），压缩后存储
+from collections import OrderedDict
 
-# 从环境变量读取 Redis URL，或者使用默认值
+# 从环境变量读取 Redis URL，或者使用默认值。
+# Redis 与应用同机部署时建议改用 Unix 域套接字，绕开 TCP 协议栈
+# （无握手/校验和/Nagle，syscall 更少），redis-py 的 from_url 原生支持：
+#   REDIS_URL=unix:///var/run/redis/redis.sock?db=0
+# 容器化部署时把宿主机的 /var/run/redis 作为 volume 挂进 API 和 worker 容器即可。
 REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
 
+# 连接池大小通过环境变量暴露：API 进程和 Celery worker 的并发模型不同，
+# 可以各自独立调整，默认 64 足以覆盖单个 Uvicorn worker 的并发量。
+REDIS_MAX_CONNECTIONS = int(os.environ.get('REDIS_MAX_CONNECTIONS', '64'))
+
 # Synchronous client (for Celery tasks and potentially other sync code)
-redis_client = redis.StrictRedis.from_url(REDIS_URL, decode_responses=True)
+# BlockingConnectionPool: 池耗尽时调用方最多等待 timeout 秒拿连接，
+# 而不是直接抛 ConnectionError，避免高并发下的尾延迟雪崩。
+_sync_connection_pool = redis.BlockingConnectionPool.from_url(
+    REDIS_URL,
+    max_connections=REDIS_MAX_CONNECTIONS,
+    timeout=2,
+    # socket_timeout 防止单个卡死的连接无限占住 Celery worker；
+    # 超时的幂等命令自动在新连接上重试一次
+    socket_timeout=2,
+    retry_on_timeout=True,
+    socket_keepalive=True,
+    health_check_interval=30,
+    # 快讯数据以 zstd 压缩的二进制形式存储，客户端不能再统一按 UTF-8 解码；
+    # 少数确实需要 str 的调用点（如 last_processed_id）在读取后自行 decode。
+    decode_responses=False
+)
+redis_client = redis.StrictRedis(connection_pool=_sync_connection_pool)
 
 # Asynchronous client (for FastAPI and other asyncio code)
-async_redis_client = aioredis.StrictRedis.from_url(REDIS_URL, decode_responses=True)
+# 与同步客户端同样使用显式限定大小的阻塞连接池。
+# 两个客户端并存的开销可以忽略：BlockingConnectionPool 按需建立连接，
+# 进程只会为它实际使用的客户端打开 socket，另一个只是几个空闲的 Python 对象。
+_async_connection_pool = aioredis.BlockingConnectionPool.from_url(
+    REDIS_URL,
+    max_connections=REDIS_MAX_CONNECTIONS,
+    timeout=2,
+    retry_on_timeout=True,
+    socket_keepalive=True,
+    health_check_interval=30,
+    decode_responses=False
+)
+async_redis_client = aioredis.StrictRedis(connection_pool=_async_connection_pool)
 
 # --- Redis Key 常量定义 ---
 # 将所有 Redis key 的前缀或模式统一定义为常量，方便管理和避免在代码中硬编码字符串。
@@ -23,6 +63,11 @@ SINA_LIVE_FLASHES_LAST_PROCESSED_ID_KEY = "sina_live_flashes:last_processed_id"
 # 例如: flash:sina_live_12345
 FLASH_DATA_PREFIX = "flash:"
 
+# LLM 分析结果的 Key 前缀 (后跟 flash_id)，例如: flash_analysis:sina_live_12345
+# 分析结果独立存储：LLM 任务写入时只需一条 SET，无需把整条快讯读出-修改-写回，
+# 也消除了两个任务竞争同一条快讯时丢失更新的风险。读取侧自动合并为 llm_analysis 字段。
+FLASH_ANALYSIS_PREFIX = "flash_analysis:"
+
 # 按股票代码索引快讯 ID 的 Sorted Set Key 前缀 (后跟 symbol_code)
 # 例如: symbol_flashes:SZ000001
 # Score: 快讯的发布时间戳 (Unix timestamp), Member: 快讯的 ID (例如 sina_live_12345)
@@ -31,9 +76,82 @@ SYMBOL_FLASHES_PREFIX = "symbol_flashes:"
 # 全局快讯ID列表 (Sorted Set)，member: <flash_id>, score: publish_timestamp
 ALL_FLASHES_BY_TIME_KEY = "all_flashes_by_time"
 
+# 仅包含已完成 LLM 分析的快讯ID (Sorted Set)，member/score 同上。
+# 由 analyze_flash_with_llm_task 维护，API 直接对其做精确分页，
+# 无需先取出全部ID再在 Python 侧过滤未分析的条目。
+ANALYZED_FLASHES_BY_TIME_KEY = "analyzed_flashes_by_time"
+
+# 单调递增的"已分析集合版本号" (String, INCR)。
+# 每当 ANALYZED_FLASHES_BY_TIME_KEY 被修改时加一，API 用它生成 ETag，
+# 使客户端可以通过 If-None-Match 得到 304 而跳过整个查询与序列化。
+ANALYZED_FLASHES_VERSION_KEY = "analyzed_flashes:version"
+
 # 默认过期时间（例如7天）
 DEFAULT_EXPIRATION_SECONDS = 7 * 24 * 60 * 60
 
+# --- 快讯数据序列化与压缩 ---
+# 快讯正文加 llm_analysis 通常有数 KB。写入路径为 MessagePack + zstd level 3：
+# MessagePack 免去 JSON 的字符串转义和数字文本化，zstd 再将 Redis 内存占用
+# 和每次读写的网络字节数降低 2-4 倍，CPU 开销可忽略。
+#
+# zstd 的 Compressor/Decompressor 各自持有单个 ZSTD 上下文，且在（解）压缩
+# 期间释放 GIL，多线程共用同一实例是未定义行为（批量分析任务通过
+# asyncio.to_thread 并发调用这里，共享实例会直接段错误）。因此上下文
+# 按线程懒创建，放在 threading.local 中，各线程内仍然复用。
+# msgspec 的 Encoder/Decoder 无此问题，可安全跨线程共享。
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+_zstd_local = threading.local()
+
+def _get_zstd_compressor() -> zstd.ZstdCompressor:
+    compressor = getattr(_zstd_local, "compressor", None)
+    if compressor is None:
+        compressor = _zstd_local.compressor = zstd.ZstdCompressor(level=3)
+    return compressor
+
+def _get_zstd_decompressor() -> zstd.ZstdDecompressor:
+    decompressor = getattr(_zstd_local, "decompressor", None)
+    if decompressor is None:
+        decompressor = _zstd_local.decompressor = zstd.ZstdDecompressor()
+    return decompressor
+
+# Encoder/Decoder 实例可复用（编码缓冲区在实例内部复用），比模块级函数更快
+_msgpack_encoder = msgspec.msgpack.Encoder()
+_msgpack_decoder = msgspec.msgpack.Decoder()
+
+def _encode_payload(obj: dict) -> bytes:
+    """将快讯数据编码为 zstd 压缩的 MessagePack 字节串。"""
+    return _get_zstd_compressor().compress(_msgpack_encoder.encode(obj))
+
+def _decompress_payload(blob: bytes) -> bytes:
+    """解压快讯数据。兼容历史数据：仅当前缀为 zstd magic number 时解压，否则原样返回。"""
+    if blob.startswith(_ZSTD_MAGIC):
+        return _get_zstd_decompressor().decompress(blob)
+    return blob
+
+def _decode_payload(blob: bytes) -> dict:
+    """
+    解压并反序列化快讯数据。兼容历史数据：JSON 对象以 '{' (0x7b) 开头，
+    而 MessagePack 的 map 头字节不可能是该值，据此区分新旧格式。
+    """
+    raw = _decompress_payload(blob)
+    if raw[:1] == b"{":
+        return orjson.loads(raw)
+    return _msgpack_decoder.decode(raw)
+
+# --- 进程内缓存（仅缓存已完成 LLM 分析的快讯） ---
+# 快讯一旦写入 llm_analysis 便不再变化，可以安全地在本进程缓存其反序列化结果，
+# 省去热点条目每次请求的 Redis 往返和 JSON 解码。
+# 使用 OrderedDict 实现简单 LRU；store_flash_data 写入时主动失效对应条目。
+_ANALYZED_CACHE_MAX_SIZE = 4096
+_analyzed_flash_cache: OrderedDict = OrderedDict()
+
+def _analyzed_cache_put(key_suffix: str, flash_data: dict) -> None:
+    """将已分析的快讯放入进程内 LRU 缓存，超出容量时淘汰最久未使用的条目。"""
+    _analyzed_flash_cache[key_suffix] = flash_data
+    _analyzed_flash_cache.move_to_end(key_suffix)
+    while len(_analyzed_flash_cache) > _ANALYZED_CACHE_MAX_SIZE:
+        _analyzed_flash_cache.popitem(last=False)
+
 # --- 辅助函数 --- 
 def store_flash_data(key_suffix: str, data_to_store: dict, pipeline=None, expiration_seconds: int = DEFAULT_EXPIRATION_SECONDS) -> bool:
     """
@@ -51,22 +169,125 @@ def store_flash_data(key_suffix: str, data_to_store: dict, pipeline=None, expira
         bool: 如果操作成功则返回 True，否则返回 False。
     """
     redis_key = f"{FLASH_DATA_PREFIX}{key_suffix}"
+    # 该快讯即将被覆盖，使进程内缓存的旧副本失效
+    _analyzed_flash_cache.pop(key_suffix, None)
     try:
-        # 确保中文字符按原样存储，而不是ASCII转义
-        json_data = json.dumps(data_to_store, ensure_ascii=False)
+        compressed_data = _encode_payload(data_to_store)
         target_client = pipeline if pipeline else redis_client
-        target_client.set(redis_key, json_data, ex=expiration_seconds)
+        target_client.set(redis_key, compressed_data, ex=expiration_seconds)
         return True
     except redis.RedisError as e:
         print(f"Redis 存储错误 (key: {redis_key}): {e}")
         return False
     except TypeError as e:
-        print(f"JSON 序列化错误 (key: {redis_key}): {e}")
+        print(f"序列化错误 (key: {redis_key}): {e}")
         return False
 
+def store_flash_analysis(key_suffix: str, analysis: dict, pipeline=None, expiration_seconds: int = DEFAULT_EXPIRATION_SECONDS) -> bool:
+    """
+    将 LLM 分析结果独立存储到 'flash_analysis:<key_suffix>' 键。
+    只有一条 SET，不触碰快讯主体；读取函数负责把它合并为 llm_analysis 字段。
+
+    参数:
+        key_suffix (str): 快讯 ID。
+        analysis (dict): LLM 分析结果。
+        pipeline (redis.client.Pipeline | None): 可选的 pipeline 对象。
+        expiration_seconds (int): 键的过期时间（秒），应与快讯主体保持一致。
+
+    返回:
+        bool: 如果操作成功则返回 True，否则返回 False。
+    """
+    redis_key = f"{FLASH_ANALYSIS_PREFIX}{key_suffix}"
+    # 该快讯的合并结果即将变化，使进程内缓存的旧副本失效
+    _analyzed_flash_cache.pop(key_suffix, None)
+    try:
+        compressed_data = _encode_payload(analysis)
+        target_client = pipeline if pipeline else redis_client
+        target_client.set(redis_key, compressed_data, ex=expiration_seconds)
+        return True
+    except redis.RedisError as e:
+        print(f"Redis 存储错误 (key: {redis_key}): {e}")
+        return False
+    except TypeError as e:
+        print(f"序列化错误 (key: {redis_key}): {e}")
+        return False
+
+def store_flash_batch(items: list[tuple[str, dict]], pipeline=None, expiration_seconds: int = DEFAULT_EXPIRATION_SECONDS) -> bool:
+    """
+    批量存储快讯数据：整批 SET 在单个 pipeline 中一次往返完成，
+    而不是每条快讯付出一次同步 RTT。
+
+    参数:
+        items (list[tuple[str, dict]]): (快讯ID, 快讯数据) 二元组列表。
+        pipeline (redis.client.Pipeline | None): 可选的外部 pipeline；提供时命令只是
+                                                 追加到其中，由调用方统一 execute。
+        expiration_seconds (int): 各键的过期时间（秒）。
+
+    返回:
+        bool: 如果操作成功则返回 True，否则返回 False。
+    """
+    if not items:
+        return True
+    for key_suffix, _ in items:
+        _analyzed_flash_cache.pop(key_suffix, None)
+    try:
+        if pipeline is not None:
+            for key_suffix, data_to_store in items:
+                pipeline.set(f"{FLASH_DATA_PREFIX}{key_suffix}",
+                             _encode_payload(data_to_store),
+                             ex=expiration_seconds)
+            return True
+        # transaction=False: 各键相互独立，无需 MULTI/EXEC 的原子性开销
+        with redis_client.pipeline(transaction=False) as pipe:
+            for key_suffix, data_to_store in items:
+                pipe.set(f"{FLASH_DATA_PREFIX}{key_suffix}",
+                         _encode_payload(data_to_store),
+                         ex=expiration_seconds)
+            pipe.execute()
+        return True
+    except redis.RedisError as e:
+        print(f"Redis 批量存储错误 ({len(items)} 条快讯): {e}")
+        return False
+    except TypeError as e:
+        print(f"序列化错误 (批量存储): {e}")
+        return False
+
+def add_to_time_index_batch(mapping: dict[str, float], index_key: str = ALL_FLASHES_BY_TIME_KEY, pipeline=None, nx: bool = False) -> bool:
+    """
+    将一批 (快讯ID -> 发布时间戳) 成员以单条多成员 ZADD 加入时间索引。
+
+    参数:
+        mapping (dict[str, float]): member -> score 映射。
+        index_key (str): 目标 Sorted Set 键，默认全局时间索引。
+        pipeline (redis.client.Pipeline | None): 可选的外部 pipeline。
+        nx (bool): True 时只新增成员，不改写已有成员的 score。
+
+    返回:
+        bool: 如果操作成功则返回 True，否则返回 False。
+    """
+    if not mapping:
+        return True
+    try:
+        target_client = pipeline if pipeline is not None else redis_client
+        target_client.zadd(index_key, mapping, nx=nx)
+        return True
+    except redis.RedisError as e:
+        print(f"Redis 批量 ZADD 错误 (key: {index_key}): {e}")
+        return False
+
+def _merge_flash_and_analysis(json_data, analysis_data) -> dict | None:
+    """将快讯主体与独立存储的分析结果（均可能为 None）解码并合并为单个字典。"""
+    if not json_data:
+        return None
+    flash_data = _decode_payload(json_data)
+    if analysis_data:
+        flash_data["llm_analysis"] = _decode_payload(analysis_data)
+    return flash_data
+
 def get_flash_data(key_suffix: str) -> dict | None:
     """
-    从 Redis 中获取指定键的快讯数据（JSON字符串）并反序列化为字典。
+    从 Redis 中获取指定键的快讯数据并反序列化为字典。
+    独立存储的 LLM 分析结果（如存在）会被合并为 llm_analysis 字段。
 
     参数:
         key_suffix (str): 用于构成 Redis 键的后缀部分 (例如快讯的 ID)。
@@ -76,17 +297,138 @@ def get_flash_data(key_suffix: str) -> dict | None:
     """
     redis_key = f"{FLASH_DATA_PREFIX}{key_suffix}"
     try:
-        json_data = redis_client.get(redis_key)
-        if json_data:
-            return json.loads(json_data)
-        return None
+        with redis_client.pipeline(transaction=False) as pipe:
+            pipe.get(redis_key)
+            pipe.get(f"{FLASH_ANALYSIS_PREFIX}{key_suffix}")
+            json_data, analysis_data = pipe.execute()
+        return _merge_flash_and_analysis(json_data, analysis_data)
     except redis.RedisError as e:
         print(f"Redis 读取错误 (key: {redis_key}): {e}")
         return None
-    except json.JSONDecodeError as e:
-        print(f"JSON 反序列化错误 (key: {redis_key}): {e}. Data: {json_data[:200] if json_data else 'None'}") # 打印部分数据帮助调试
+    except (orjson.JSONDecodeError, msgspec.DecodeError, zstd.ZstdError) as e:
+        print(f"快讯数据解码错误 (key: {redis_key}): {e}") # 打印部分数据帮助调试
         return None
 
+def get_flash_data_many(key_suffixes: list[str]) -> list[dict | None]:
+    """
+    通过单个 pipeline 批量获取多条快讯数据，避免每条快讯一次网络往返。
+
+    参数:
+        key_suffixes (list[str]): 快讯 ID 列表（用于构成各 Redis 键的后缀部分）。
+
+    返回:
+        list[dict | None]: 与输入顺序一一对应的列表；某条数据缺失或无效时对应位置为 None。
+    """
+    if not key_suffixes:
+        return []
+    try:
+        # transaction=False: 各键相互独立，无需 MULTI/EXEC 的原子性开销
+        with redis_client.pipeline(transaction=False) as pipe:
+            for key_suffix in key_suffixes:
+                pipe.get(f"{FLASH_DATA_PREFIX}{key_suffix}")
+                pipe.get(f"{FLASH_ANALYSIS_PREFIX}{key_suffix}")
+            raw_results = pipe.execute()
+    except redis.RedisError as e:
+        print(f"Redis 批量读取错误 ({len(key_suffixes)} 个键): {e}")
+        return [None] * len(key_suffixes)
+
+    results: list[dict | None] = []
+    for i, key_suffix in enumerate(key_suffixes):
+        try:
+            results.append(_merge_flash_and_analysis(raw_results[2 * i], raw_results[2 * i + 1]))
+        except (orjson.JSONDecodeError, msgspec.DecodeError, zstd.ZstdError) as e:
+            print(f"快讯数据解码错误 (key: {FLASH_DATA_PREFIX}{key_suffix}): {e}")
+            results.append(None)
+    return results
+
+# 将 ZREVRANGEBYSCORE + N 次 GET 融合为单个 Lua 脚本：Redis 在服务端完成
+# 索引遍历和数据收集，客户端只有一次网络往返。注意快讯数据以字符串 (SET) 存储，
+# 因此脚本内使用 GET 而非 HGETALL。返回值为 [id1, payload1, id2, payload2, ...]。
+# register_script 仅在本地计算 SHA，首次执行时才真正加载到 Redis。
+_FETCH_ANALYZED_RANGE_LUA = """
+-- 偏移量超出窗口内条目总数时直接返回空表：
+-- 大 offset 会让 ZREVRANGEBYSCORE 线性遍历 skiplist，ZCOUNT 则走 O(log N) 的排名差值。
+-- 放在脚本内做，与范围查询共享同一次网络往返。
+local total = redis.call('ZCOUNT', KEYS[1], ARGV[2], ARGV[1])
+if tonumber(ARGV[3]) >= total then
+    return {}
+end
+local ids = redis.call('ZREVRANGEBYSCORE', KEYS[1], ARGV[1], ARGV[2], 'LIMIT', ARGV[3], ARGV[4])
+local out = {}
+for i, id in ipairs(ids) do
+    out[3 * i - 2] = id
+    out[3 * i - 1] = redis.call('GET', KEYS[2] .. id)
+    out[3 * i] = redis.call('GET', KEYS[3] .. id)
+end
+return out
+"""
+_fetch_analyzed_range_script = redis_client.register_script(_FETCH_ANALYZED_RANGE_LUA)
+_afetch_analyzed_range_script = async_redis_client.register_script(_FETCH_ANALYZED_RANGE_LUA)
+
+def _decode_range_pairs(raw_pairs: list) -> list[dict]:
+    """将 Lua 脚本返回的 [id, 快讯, 分析结果, ...] 扁平列表解码为快讯字典列表，优先命中进程内缓存。"""
+    results = []
+    for i in range(0, len(raw_pairs), 3):
+        key_suffix, json_data, analysis_data = raw_pairs[i], raw_pairs[i + 1], raw_pairs[i + 2]
+        if isinstance(key_suffix, bytes):
+            key_suffix = key_suffix.decode("utf-8") # 缓存键统一为 str
+        cached = _analyzed_flash_cache.get(key_suffix)
+        if cached is not None:
+            _analyzed_flash_cache.move_to_end(key_suffix)
+            results.append(cached)
+            continue
+        try:
+            flash_data = _merge_flash_and_analysis(json_data, analysis_data)
+        except (orjson.JSONDecodeError, msgspec.DecodeError, zstd.ZstdError) as e:
+            print(f"快讯数据解码错误 (key: {FLASH_DATA_PREFIX}{key_suffix}): {e}")
+            continue
+        if flash_data is None:
+            continue # 索引条目短暂地比数据键活得更久（键过期），跳过
+        if 'llm_analysis' in flash_data:
+            _analyzed_cache_put(key_suffix, flash_data)
+        results.append(flash_data)
+    return results
+
+def get_analyzed_flashes_range(min_score: float, start: int, num: int, max_score='+inf') -> list[dict]:
+    """
+    从 ANALYZED_FLASHES_BY_TIME_KEY 按时间倒序取出 [start, start+num) 范围内的
+    快讯并直接返回其数据，索引查询与数据读取在 Redis 服务端一次完成。
+    命中进程内缓存的条目跳过 JSON 解码。
+
+    参数:
+        min_score (float): 时间窗口下界 (Unix timestamp)。
+        start (int): 分页偏移量。
+        num (int): 返回条目数上限。
+        max_score: 时间窗口上界，默认 '+inf'。
+
+    返回:
+        list[dict]: 按发布时间倒序排列的快讯数据列表（缺失/无效条目被跳过）。
+    """
+    try:
+        raw_pairs = _fetch_analyzed_range_script(
+            keys=[ANALYZED_FLASHES_BY_TIME_KEY, FLASH_DATA_PREFIX, FLASH_ANALYSIS_PREFIX],
+            args=[max_score, min_score, start, num]
+        )
+    except redis.RedisError as e:
+        print(f"Redis Lua 脚本执行错误 ({ANALYZED_FLASHES_BY_TIME_KEY}): {e}")
+        return []
+    return _decode_range_pairs(raw_pairs)
+
+async def aget_analyzed_flashes_range(min_score: float, start: int, num: int, max_score='+inf') -> list[dict]:
+    """
+    get_analyzed_flashes_range 的异步版本，供 FastAPI 端点使用：
+    Redis 往返期间事件循环可以继续服务其他请求，而不是被同步调用阻塞。
+    """
+    try:
+        raw_pairs = await _afetch_analyzed_range_script(
+            keys=[ANALYZED_FLASHES_BY_TIME_KEY, FLASH_DATA_PREFIX, FLASH_ANALYSIS_PREFIX],
+            args=[max_score, min_score, start, num]
+        )
+    except aioredis.RedisError as e:
+        print(f"Async Redis Lua 脚本执行错误 ({ANALYZED_FLASHES_BY_TIME_KEY}): {e}")
+        return []
+    return _decode_range_pairs(raw_pairs)
+
 # --- Async helper example (if needed by FastAPI for general gets/sets) ---
 # async def get_flash_data_async(key_suffix: str) -> dict | None:
 #     redis_key = f"{FLASH_DATA_PREFIX}{key_suffix}"
@@ -111,7 +453,7 @@ if __name__ == '__main__':
             # 示例：设置和获取 last_processed_id
             test_last_id_key = "test:last_id"
             redis_client.set(test_last_id_key, "98765")
-            last_id = redis_client.get(test_last_id_key)
+            last_id = redis_client.get(test_last_id_key).decode() # decode_responses=False，值为 bytes
             print(f"测试获取的 last_id: {last_id}")
             redis_client.delete(test_last_id_key) # 清理测试数据
             
@@ -143,7 +485,7 @@ if __name__ == '__main__':
                 
                 # 验证获取
                 latest_ids = redis_client.zrevrange(ALL_FLASHES_BY_TIME_KEY, 0, 0) # 获取最新的一个
-                if latest_ids and latest_ids[0] == sample_flash_id:
+                if latest_ids and latest_ids[0].decode() == sample_flash_id:
                     print(f"成功从 {ALL_FLASHES_BY_TIME_KEY} 获取到最新的ID: {latest_ids[0]}")
                 else:
                     print(f"从 {ALL_FLASHES_BY_TIME_KEY} 获取最新ID失败或不匹配。获取到: {latest_ids}")
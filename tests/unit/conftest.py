@@ -0,0 +1,76 @@
+import json
+from pathlib import Path
+
+import pytest
+
+# Recorded API payloads replayed by the tests ("record once, replay forever"):
+# the canonical success response lives on disk instead of being rebuilt in code.
+_CASSETTE_DIR = Path(__file__).parent / "cassettes"
+
+# Prebuilt parts of a mock feed item: the invariant keys live in one template
+# merged per call, and the empty-ext JSON string is serialized exactly once.
+_EMPTY_EXT_JSON = json.dumps({})
+_ITEM_TEMPLATE = {
+    "zhibo_id": 152,
+    "type": 0,
+    "tag": [{"id": "3", "name": "公司"}],
+    # Ensure ext is always a JSON string, as in the real API
+    "ext": _EMPTY_EXT_JSON,
+}
+
+
+@pytest.fixture(scope="session")
+def make_api_item():
+    """Session-scoped factory for a single mock Sina feed item.
+
+    Returned as a plain function so pytest builds it once per session
+    instead of re-resolving a helper per test.
+    """
+    def _make(item_id, create_time_str, content, stocks_data=None, docurl_in_ext=None):
+        item = {
+            **_ITEM_TEMPLATE,
+            "id": item_id,
+            "rich_text": content,
+            "create_time": create_time_str,  # CST
+            "update_time": create_time_str,
+            "docurl": f"https://finance.sina.com.cn/top_level_doc_{item_id}.shtml"
+        }
+        if stocks_data or docurl_in_ext:
+            item["ext"] = json.dumps(
+                {k: v for k, v in (("stocks", stocks_data), ("docurl", docurl_in_ext)) if v}
+            )
+        return item
+
+    return _make
+
+
+@pytest.fixture(scope="session")
+def expected_utc_timestamps():
+    """Expected UTC timestamp strings for the cassette's fixed CST create times.
+
+    Computed once per session; the imports are deferred into the fixture so
+    tests that never check timestamps skip the timezone machinery entirely.
+    """
+    from datetime import datetime, timezone
+
+    from core.news_sources.sina_live_client import CST
+
+    def _iso(dt):
+        return dt.astimezone(timezone.utc).isoformat(timespec="seconds").replace("+00:00", "Z")
+
+    return {
+        "item1": _iso(datetime(2025, 5, 15, 10, 0, 0, tzinfo=CST)),
+        "item2": _iso(datetime(2025, 5, 15, 9, 59, 0, tzinfo=CST)),
+    }
+
+
+@pytest.fixture(scope="session")
+def success_api_payload():
+    """The standard two-item success payload, loaded from its cassette once per session.
+
+    Tests only read it (the client never mutates the parsed response), so
+    sharing one dict tree is safe; tests that need a broken variant build
+    their own items instead of mutating this one.
+    """
+    with open(_CASSETTE_DIR / "sina_feed_success.json", encoding="utf-8") as f:
+        return json.load(f)